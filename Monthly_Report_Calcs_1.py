@@ -3,18 +3,24 @@
 import subprocess
 import shutil
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 
 from dateutil.relativedelta import relativedelta
+import pyarrow.compute as pc
 from pyarrow.dataset import dataset as arrow_dataset
-from concurrent.futures import ProcessPoolExecutor
 import Monthly_Report_Functions as mrf
 import Monthly_Report_Calcs_init as mr_init
 import counts
 import s3_parquet_io as s3_io
+import database_functions as dbf
 import utilities as utils
 import metrics
 import aggregations as agg
+from configs import signal_id_array
+from pipeline import run_pipeline
+from adaptive_pool import run_adaptive
+import memory_profile
 
 
 def run_python_script(script, args="", wait=False):
@@ -51,14 +57,41 @@ def run_counts():
                          counts=True)
         else:
             for date_ in date_range:
-                utils.keep_trying(counts.get_counts2, 2, date_, bucket=mrf.conf["bucket"], conf_athena=mrf.conf[
+                utils.keep_trying(counts.get_counts2, 2, date_, service="get_counts2", bucket=mrf.conf["bucket"], conf_athena=mrf.conf[
                     "athena"],
                             uptime=True, counts=True)
+        dbf.flush_athena_partitions(mrf.conf["athena"])
 
         print("\n---------------------- Finished counts ---------------------------\n")
         print(f"{datetime.now()} monthly cu [5 of 11]")
 
 
+def read_counts_day(ds, date_):
+    try:
+        return ds.to_table(filter=(ds.schema["Date"] == str(date_.date()))).to_pandas()
+    except Exception:
+        return pd.DataFrame(columns=["SignalID", "CallPhase", "Detector", "Timeperiod", "vol"])
+
+
+def process_vpd_vph_day(date_):
+    """Vehicles per day and per hour from one day of local 1-hour adjusted counts."""
+    try:
+        ac_ds = arrow_dataset("adjusted_counts_1hr/")
+        ac_df = ac_ds.to_table(filter=(ac_ds.schema["Date"] == str(date_.date()))).to_pandas()
+    except Exception:
+        return
+
+    if not ac_df.empty:
+        ac_df["Date"] = pd.to_datetime(ac_df["Timeperiod"]).dt.date
+        vpd = metrics.get_vpd(ac_df)
+        s3_io.s3_upload_parquet_date_split(vpd, prefix="vpd", bucket=mrf.conf["bucket"], table_name="vehicles_pd",
+                                           conf_athena=mrf.conf["athena"])
+
+        vph = agg.get_vph(ac_df, interval="1 hour")
+        s3_io.s3_upload_parquet_date_split(vph, prefix="vph", bucket=mrf.conf["bucket"], table_name="vehicles_ph",
+                                           conf_athena=mrf.conf["athena"])
+
+
 def process_month(yyyy_mm):
     """
     Process counts and adjusted counts for a given month.
@@ -71,35 +104,53 @@ def process_month(yyyy_mm):
     counts.prep_db_for_adjusted_counts_arrow("filtered_counts_1hr", mrf.conf, date_range)
     counts.get_adjusted_counts_arrow("filtered_counts_1hr", "adjusted_counts_1hr", mrf.conf)
 
-    fc_ds = utils.keep_trying(lambda: arrow_dataset("filtered_counts_1hr/"), 3, 60)
-    ac_ds = utils.keep_trying(lambda: arrow_dataset("adjusted_counts_1hr/"), 3, 60)
-
-    for date_ in date_range:
-        try:
-            ac_df = ac_ds.to_table(filter=(ac_ds.schema["Date"] == str(date_.date()))).to_pandas()
-        except Exception:
-            ac_df = pd.DataFrame(columns=["SignalID", "CallPhase", "Detector", "Timeperiod", "vol"])
-
-        s3_io.s3_upload_parquet_date_split(ac_df, mrf.conf["bucket"], "adjusted_counts_1hr", "adjusted_counts_1hr",
-                                      mrf.conf["athena"])
-        utils.write_signal_details(date_.strftime("%Y-%m-%d"), mrf.conf, mr_init.signals_list)
-
-    def process_day(date_):
+    fc_ds = utils.keep_trying(lambda: arrow_dataset("filtered_counts_1hr/"), 3, timeout=60,
+                              service="local:filtered_counts_1hr")
+    ac_ds = utils.keep_trying(lambda: arrow_dataset("adjusted_counts_1hr/"), 3, timeout=60,
+                              service="local:adjusted_counts_1hr")
+
+    def read_1hr(date_):
+        # Raw counts are only needed for signal_details, so only its columns and signals are read
+        date_str = date_.strftime("%Y-%m-%d")
+        rc_df = s3_io.s3_read_parquet(bucket=mrf.conf["bucket"],
+                                      object_key=f"mark/counts_1hr/date={date_str}/counts_1hr_{date_str}.parquet",
+                                      date_=date_str, columns=utils.SIGNAL_DETAIL_KEYS + ["vol"],
+                                      signals_list=mr_init.signals_list)
+        return rc_df, read_counts_day(fc_ds, date_), read_counts_day(ac_ds, date_)
+
+    def in_signals_list(df):
+        if mr_init.signals_list is None:
+            return df
+        return df[np.isin(signal_id_array(df["SignalID"]), signal_id_array(mr_init.signals_list))]
+
+    def compute_1hr(date_, data):
+        # signal_details comes from the day's frames already in memory, limited
+        # to signals_list as when it was read back from S3
+        rc_df, fc_df, ac_df = data
+        memory_profile.track(f"filtered_counts_1hr {date_:%Y-%m-%d}", fc_df)
+        memory_profile.track(f"adjusted_counts_1hr {date_:%Y-%m-%d}", ac_df)
         try:
-            ac_df = ac_ds.to_table(filter=(ac_ds.schema["Date"] == str(date_.date()))).to_pandas()
-        except Exception:
-            return
-
-        if not ac_df.empty:
-            ac_df["Date"] = pd.to_datetime(ac_df["Timeperiod"]).dt.date
-            vpd = metrics.get_vpd(ac_df)
-            s3_io.s3_upload_parquet_date_split(vpd, mrf.conf["bucket"], "vpd", "vehicles_pd", mrf.conf["athena"])
-
-            vph = agg.get_vph(ac_df, interval="1 hour")
-            s3_io.s3_upload_parquet_date_split(vph, mrf.conf["bucket"], "vph", "vehicles_ph", mrf.conf["athena"])
-
-    with ProcessPoolExecutor(max_workers=mrf.usable_cores) as executor:
-        executor.map(process_day, date_range)
+            details = None
+            if not (rc_df.empty or fc_df.empty or ac_df.empty):
+                details = utils.build_signal_details(rc_df, in_signals_list(fc_df), in_signals_list(ac_df))
+        except Exception as e:
+            print(f"Can't build signal details for {date_:%Y-%m-%d}: {e}")
+        return ac_df, details
+
+    def write_1hr(date_, result):
+        ac_df, details = result
+        s3_io.s3_upload_parquet_date_split(ac_df, prefix="adjusted_counts_1hr", bucket=mrf.conf["bucket"],
+                                           table_name="adjusted_counts_1hr", conf_athena=mrf.conf["athena"])
+        if details is not None:
+            utils.upload_signal_details(details, date_.strftime("%Y-%m-%d"), mrf.conf)
+
+    # Read day N+1 and upload day N-1 while day N is computed
+    with memory_profile.stage(f"adjusted_counts_1hr {yyyy_mm}"):
+        run_pipeline(date_range, read=read_1hr, compute=compute_1hr, write=write_1hr)
+
+    # Worker count adapts to the memory the days actually take, up to usable_cores
+    with memory_profile.stage(f"vpd_vph_1hr {yyyy_mm}"):
+        run_adaptive("vpd_vph_1hr", process_vpd_vph_day, date_range, max_workers=mrf.usable_cores)
 
     shutil.rmtree("filtered_counts_1hr", ignore_errors=True)
     shutil.rmtree("adjusted_counts_1hr", ignore_errors=True)
@@ -108,23 +159,40 @@ def process_month(yyyy_mm):
     counts.prep_db_for_adjusted_counts_arrow("filtered_counts_15min", mrf.conf, date_range)
     counts.get_adjusted_counts_arrow("filtered_counts_15min", "adjusted_counts_15min", mrf.conf)
 
-    fc_ds = utils.keep_trying(lambda: arrow_dataset("filtered_counts_15min/"), 3, 60)
-    ac_ds = utils.keep_trying(lambda: arrow_dataset("adjusted_counts_15min/"), 3, 60)
-
-    for date_ in date_range:
-        try:
-            ac_df = ac_ds.to_table(filter=(ac_ds.schema["Date"] == str(date_.date()))).to_pandas()
-        except Exception:
-            ac_df = pd.DataFrame(columns=["SignalID", "CallPhase", "Detector", "Timeperiod", "vol"])
-
-        s3_io.s3_upload_parquet_date_split(ac_df, mrf.conf["bucket"], "adjusted_counts_15min", "adjusted_counts_15min",
-                                      mrf.conf["athena"])
-
-        throughput = metrics.get_thruput(ac_df)
-        s3_io.s3_upload_parquet_date_split(throughput, mrf.conf["bucket"], "tp", "throughput", mrf.conf["athena"])
-
-        vp15 = agg.get_vph(ac_df, interval="15 min")
-        s3_io.s3_upload_parquet_date_split(vp15, mrf.conf["bucket"], "vp15", "vehicles_15min", mrf.conf["athena"])
+    fc_ds = utils.keep_trying(lambda: arrow_dataset("filtered_counts_15min/"), 3, timeout=60,
+                              service="local:filtered_counts_15min")
+    ac_ds = utils.keep_trying(lambda: arrow_dataset("adjusted_counts_15min/"), 3, timeout=60,
+                              service="local:adjusted_counts_15min")
+
+    def compute_15min(date_, ac_df):
+        memory_profile.track(f"adjusted_counts_15min {date_:%Y-%m-%d}", ac_df)
+        throughput = metrics.get_thruput(ac_df.copy())
+        vp15 = agg.get_vph(ac_df.copy(), interval="15 min")
+        # The day's counts are not queued for the writer; it streams them from the
+        # local dataset in chunks of signals that fit the `signal_chunks` budget
+        return utils.get_signals_chunks(ac_df), throughput, vp15
+
+    def write_15min(date_, result):
+        signal_chunks, throughput, vp15 = result
+        if signal_chunks:
+            date_str = date_.strftime("%Y-%m-%d")
+            day = pc.field("Date") == date_str
+            # Re-read from the local dataset on each attempt of the upload
+            chunks = lambda: (ac_ds.to_table(filter=day & pc.field("SignalID").isin(signals)).to_pandas()
+                              for signals in signal_chunks)
+            s3_io.s3_upload_parquet_stream(chunks, date_str,
+                                           f"adjusted_counts_15min_{date_str}", bucket=mrf.conf["bucket"],
+                                           table_name="adjusted_counts_15min", conf_athena=mrf.conf["athena"])
+        s3_io.s3_upload_parquet_date_split(throughput, prefix="tp", bucket=mrf.conf["bucket"],
+                                           table_name="throughput", conf_athena=mrf.conf["athena"])
+        s3_io.s3_upload_parquet_date_split(vp15, prefix="vp15", bucket=mrf.conf["bucket"],
+                                           table_name="vehicles_15min", conf_athena=mrf.conf["athena"])
+
+    # Read day N+1 and upload day N-1 while day N is computed
+    with memory_profile.stage(f"adjusted_counts_15min {yyyy_mm}"):
+        run_pipeline(date_range, read=lambda date_: read_counts_day(ac_ds, date_),
+                     compute=compute_15min, write=write_15min)
+    dbf.flush_athena_partitions(mrf.conf["athena"])
 
     shutil.rmtree("filtered_counts_15min", ignore_errors=True)
     shutil.rmtree("adjusted_counts_15min", ignore_errors=True)
@@ -10,6 +10,8 @@ import Monthly_Report_Calcs_init_bkp as mr_init
 import s3_parquet_io as s3_io
 import metrics
 import utilities as utils
+from pipeline import run_pipeline
+import memory_profile
 
 
 def run_python_script(script, args="", wait=True):
@@ -47,7 +49,13 @@ def get_qs(detection_events, intervals=["hour", "15min"]):
     return result
 
 
-def get_ped_delay(date_, conf, signals_list):
+def get_ped_events(date_, conf, signals_list):
+    """Controller events of a day (push button, start of walk) from the ATSPM table"""
+    return metrics.get_spm_data_aws(date_, date_, signals_list, conf['athena'],
+                                    table=conf['athena']['atspm_table'], TWR_only=False)
+
+
+def get_ped_delay(events):
     """
     Calculate pedestrian delay using ATSPM method
     Based on push button-start of walk durations
@@ -64,7 +72,7 @@ def get_ped_delay(date_, conf, signals_list):
     return pd_data
 
 
-def get_sf_utah(date_, conf, signals_list, intervals=["hour", "15min"]):
+def get_sf_utah(cycle_data, intervals=["hour", "15min"]):
     """
     Calculate split failures using Utah method
     Based on green, start-of-red occupancies
@@ -74,7 +82,7 @@ def get_sf_utah(date_, conf, signals_list, intervals=["hour", "15min"]):
     
     for interval in intervals:
         # This would typically involve:
-        # 1. Getting cycle data for the date
+        # 1. Taking the cycle data for the date
         # 2. Analyzing green and red occupancy patterns
         # 3. Identifying split failures based on Utah methodology
         
@@ -88,87 +96,104 @@ def get_sf_utah(date_, conf, signals_list, intervals=["hour", "15min"]):
 def get_queue_spillback_date_range(start_date, end_date):
     """Process queue spillback for a date range"""
     date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    for date_ in date_range:
+
+    def read(date_):
         print(f"Processing queue spillback for {date_.date()}")
-        
-        detection_events = metrics.get_detection_events(
-            date_.date(), 
-            date_.date(), 
-            mrf.conf['athena'], 
+        return metrics.get_detection_events(
+            date_.date(),
+            date_.date(),
+            mrf.conf['athena'],
             mr_init.signals_list
         )
-        
-        if not detection_events.empty:
-            qs = get_qs(detection_events, intervals=["hour", "15min"])
-            
-            if not qs['hour'].empty:
-                s3_io.s3_upload_parquet_date_split(
-                    qs['hour'],
-                    mrf.conf['bucket'],
-                    "qs",
-                    "queue_spillback",
-                    mrf.conf['athena']
-                )
-            
-            if not qs['15min'].empty:
-                s3_io.s3_upload_parquet_date_split(
-                    qs['15min'],
-                    mrf.conf['bucket'],
-                    "qs", 
-                    "queue_spillback_15min",
-                    mrf.conf['athena']
-                )
+
+    def compute(date_, detection_events):
+        memory_profile.track(f"detection_events {date_.date()}", detection_events)
+        if detection_events.empty:
+            return None
+        return get_qs(detection_events, intervals=["hour", "15min"])
+
+    def write(date_, qs):
+        if not qs['hour'].empty:
+            s3_io.s3_upload_parquet_date_split(
+                qs['hour'],
+                prefix="qs",
+                bucket=mrf.conf['bucket'],
+                table_name="queue_spillback",
+                conf_athena=mrf.conf['athena']
+            )
+
+        if not qs['15min'].empty:
+            s3_io.s3_upload_parquet_date_split(
+                qs['15min'],
+                prefix="qs",
+                bucket=mrf.conf['bucket'],
+                table_name="queue_spillback_15min",
+                conf_athena=mrf.conf['athena']
+            )
+
+    run_pipeline(date_range, read, compute, write)
 
 
 def get_pd_date_range(start_date, end_date):
     """Process pedestrian delay for a date range"""
     date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    for date_ in date_range:
+
+    def read(date_):
         print(f"Processing pedestrian delay for {date_.date()}")
-        
-        pd_data = get_ped_delay(date_.date(), mrf.conf, mr_init.signals_list)
-        
-        if not pd_data.empty:
-            s3_io.s3_upload_parquet_date_split(
-                pd_data,
-                mrf.conf['bucket'],
-                "pd",
-                "ped_delay", 
-                mrf.conf['athena']
-            )
-    
+        return get_ped_events(date_.date(), mrf.conf, mr_init.signals_list)
+
+    def compute(date_, events):
+        memory_profile.track(f"ped_events {date_.date()}", events)
+        pd_data = get_ped_delay(events)
+        return None if pd_data.empty else pd_data
+
+    def write(date_, pd_data):
+        s3_io.s3_upload_parquet_date_split(
+            pd_data,
+            prefix="pd",
+            bucket=mrf.conf['bucket'],
+            table_name="ped_delay",
+            conf_athena=mrf.conf['athena']
+        )
+
+    run_pipeline(date_range, read=read, compute=compute, write=write)
+
     gc.collect()
 
 
 def get_sf_date_range(start_date, end_date):
     """Process split failures for a date range"""
     date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    for date_ in date_range:
+
+    def read(date_):
         print(f"Processing split failures for {date_.date()}")
-        
-        sf = get_sf_utah(date_.date(), mrf.conf, mr_init.signals_list, intervals=["hour", "15min"])
-        
+        return metrics.get_cycle_data(date_.date(), date_.date(), mrf.conf['athena'], mr_init.signals_list)
+
+    def compute(date_, cycle_data):
+        memory_profile.track(f"cycle_data {date_.date()}", cycle_data)
+        return get_sf_utah(cycle_data, intervals=["hour", "15min"])
+
+    def write(date_, sf):
         if not sf['hour'].empty:
             s3_io.s3_upload_parquet_date_split(
                 sf['hour'],
-                mrf.conf['bucket'],
-                "sf",
-                "split_failures",
-                mrf.conf['athena']
+                prefix="sf",
+                bucket=mrf.conf['bucket'],
+                table_name="split_failures",
+                conf_athena=mrf.conf['athena']
             )
-        
+
         if not sf['15min'].empty:
             s3_io.s3_upload_parquet_date_split(
                 sf['15min'],
-                mrf.conf['bucket'],
-                "sf",
-                "split_failures_15min",
-                mrf.conf['athena']
+                prefix="sf",
+                bucket=mrf.conf['bucket'],
+                table_name="split_failures_15min",
+                conf_athena=mrf.conf['athena']
             )
 
+    run_pipeline(date_range, read=read, compute=compute, write=write)
+
 
 def main():
     """Main execution function"""
@@ -190,18 +215,21 @@ def main():
     # Queue Spillback
     print(f"{datetime.now()} queue spillback [9 of 11]")
     if mrf.conf['run'].get('queue_spillback', True):
-        get_queue_spillback_date_range(start_date, end_date)
+        with memory_profile.stage("queue_spillback"):
+            get_queue_spillback_date_range(start_date, end_date)
     
     # Pedestrian Delay
     print(f"{datetime.now()} ped delay [10 of 11]")
     if mrf.conf['run'].get('ped_delay', True):
-        get_pd_date_range(start_date, end_date)
+        with memory_profile.stage("ped_delay"):
+            get_pd_date_range(start_date, end_date)
     
     # Split Failures
     print(f"{datetime.now()} split failures [11 of 11]")
     if mrf.conf['run'].get('split_failures', True):
         # Utah method, based on green, start-of-red occupancies
-        get_sf_date_range(start_date, end_date)
+        with memory_profile.stage("split_failures"):
+            get_sf_date_range(start_date, end_date)
     
     # Flash Events
     print(f"{datetime.now()} flash events [12 of 12]")
@@ -3,10 +3,8 @@ Init script for Monthly Report Calculations, This will be called at the beginnin
 initial configurations, fetching data, and preparing the environment.
 """
 import datetime
-import joblib
 from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import pyarrow.feather as feather
 from dateutil.rrule import rrule, DAILY
 from dateutil.parser import parse as date_parse
 import pandas as pd
@@ -14,17 +12,10 @@ import utilities as util
 import configs
 import Monthly_Report_Functions as mrf
 import database_functions as dbf
+import artifact_store
 from sqlalchemy import text
 
 
-def parallel_signal_fetch(date_):
-    """
-    Fetch signal IDs from S3 for a given date.
-    """
-    signal = util.get_signalids_from_s3(date_.date(), mrf.conf["bucket"])
-    return signal
-
-
 # ----- LOG START TIME -----
 print(f"\n\n{datetime.datetime.now()} Starting Calcs Script")
 
@@ -43,22 +34,16 @@ month_abbrs = util.get_month_abbrs(start_date, end_date)
 # ----- GET CORRIDORS -----
 corridors = configs.get_corridors(mrf.conf["corridors_filename_s3"], filter_signals=True)
 
+# Serialized once as zstd Arrow IPC (feather v2), written locally and uploaded
+# unless unchanged; load with artifact_store.get_artifact
 feather_filename = str(Path(mrf.conf["corridors_filename_s3"]).with_suffix(".feather"))
-feather.write_feather(corridors, feather_filename)
-
-qs_filename = Path(mrf.conf["corridors_filename_s3"]).with_suffix(".qs")
-# Save the corridors object to the .qs file
-joblib.dump(corridors, qs_filename, compress=('zlib', 3))
+artifact_store.put_artifact(corridors, mrf.conf["bucket"], feather_filename, local_path=feather_filename)
 
 # All corridors
 all_corridors = configs.get_corridors(mrf.conf["corridors_filename_s3"], filter_signals=False)
 
 feather_filename_all = str(Path("all_" + mrf.conf["corridors_filename_s3"]).with_suffix(".feather"))
-feather.write_feather(all_corridors, feather_filename_all)
-
-qs_filename_all = Path("all_" + mrf.conf["corridors_filename_s3"]).with_suffix(".qs")
-# Save the corridors object to the .qs file
-joblib.dump(corridors, qs_filename, compress=('zlib', 3))
+artifact_store.put_artifact(all_corridors, mrf.conf["bucket"], feather_filename_all, local_path=feather_filename_all)
 
 # ----- SIGNAL LIST FOR GIVEN DATE RANGE -----
 # Handle potential NaT values in date parsing - Convert to string first
@@ -84,17 +69,13 @@ except (ValueError, TypeError) as e:
     end_dt = datetime.datetime.now()
     date_range = list(rrule(DAILY, dtstart=start_dt, until=end_dt))
 
-# Use ThreadPoolExecutor for better macOS compatibility
-from concurrent.futures import ThreadPoolExecutor
-
-with ThreadPoolExecutor(max_workers=usable_cores) as executor:
-    signals_flat = list(executor.map(parallel_signal_fetch, date_range))
-
-signals_list = list(set([signal for sublist in signals_flat for signal in sublist]))
+# Signals come from the persisted signal inventory; only dates it does not
+# cover yet are listed on S3
+signals_list = util.get_signals_list(mrf.conf["bucket"], date_range[0], date_range[-1])
 
 # ----- SAVE LATEST DETECTOR CONFIG TO S3 -----
 latest_config = configs.get_latest_det_config(mrf.conf)
-util.s3write_using_qsave(latest_config, bucket=mrf.conf["bucket"], object_key="ATSPM_Det_Config_Good_Latest.qs")
+artifact_store.put_artifact(latest_config, mrf.conf["bucket"], "ATSPM_Det_Config_Good_Latest.feather")
 
 # # ----- HANDLE ATHENA PARTITIONS -----
 # athena = dbf.get_athena_connection(mrf.conf["athena"])
@@ -115,6 +96,15 @@ util.s3write_using_qsave(latest_config, bucket=mrf.conf["bucket"], object_key="A
 #
 # athena.close()
 
+# ----- ATHENA PARTITION PROJECTION -----
+# Tables listed under athena: partition_projection: in Monthly_Report.yaml get
+# date partition projection and are skipped by partition registration.
+for projected_table in mrf.conf["athena"].get("partition_projection", []):
+    try:
+        dbf.enable_partition_projection(mrf.conf["athena"], mrf.conf["bucket"], projected_table)
+    except Exception as e:
+        print(f"Error enabling partition projection for {projected_table}: {e}")
+
 try:
     print("Connecting to Athena and checking partitions...")
     athena = dbf.get_athena_connection(mrf.conf["athena"])
@@ -183,25 +173,10 @@ try:
     missing_partitions = list(set(full_date_range) - set(existing_partitions))
     print(f"Missing partitions: {len(missing_partitions)}")
 
-    if len(missing_partitions) > 10:
-        print(f"Too many missing partitions ({len(missing_partitions)}), running MSCK REPAIR TABLE")
-        try:
-            athena.execute(text(f"MSCK REPAIR TABLE {full_table_name}"))
-            print("MSCK REPAIR TABLE completed successfully")
-        except Exception as e:
-            print(f"Error running MSCK REPAIR TABLE: {e}")
-
-    elif missing_partitions:
+    if missing_partitions:
+        # One ALTER TABLE ... ADD IF NOT EXISTS statement per batch of partitions
         print(f"Adding {len(missing_partitions)} missing partitions...")
-        for i, date_ in enumerate(missing_partitions[:5]):  # Limit to first 5 to avoid timeout
-            try:
-                print(f"Adding partition {i + 1}/5: date={date_}")
-                dbf.add_athena_partition(mrf.conf["athena"], mrf.conf["bucket"], table_name, date_)
-            except Exception as e:
-                print(f"Error adding partition for {date_}: {e}")
-
-        if len(missing_partitions) > 5:
-            print(f"Note: Only added first 5 partitions. {len(missing_partitions) - 5} remaining.")
+        dbf.add_athena_partitions(mrf.conf["athena"], table_name, missing_partitions)
     else:
         print("All required partitions exist")
 
@@ -3,10 +3,8 @@ Init script for Monthly Report Calculations, This will be called at the beginnin
 initial configurations, fetching data, and preparing the environment.
 """
 import datetime
-import joblib
 from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import pyarrow.feather as feather
 from dateutil.rrule import rrule, DAILY
 from dateutil.parser import parse as date_parse
 import pandas as pd
@@ -14,14 +12,9 @@ import utilities as util
 import configs
 import Monthly_Report_Functions as mrf
 import database_functions as dbf
+import artifact_store
 
 
-def parallel_signal_fetch(date_):
-    """
-    Fetch signal IDs from S3 for a given date.
-    """
-    return util.get_signalids_from_s3(date_.date(), mrf.conf["bucket"])
-
 # ----- LOG START TIME -----
 print(f"\n\n{datetime.datetime.now()} Starting Calcs Script")
 
@@ -41,32 +34,20 @@ month_abbrs = util.get_month_abbrs(start_date, end_date)
 corridors = configs.get_corridors("/Users/achyuthpothuganti/Downloads/flex_v2/Corridors_v5_Latest.xlsx", filter_signals=True)
 
 feather_filename = str(Path("/Users/achyuthpothuganti/Downloads/flex_v2/Corridors_v5_Latest.xlsx").with_suffix(".feather"))
-qs_filename = Path("/Users/achyuthpothuganti/Downloads/flex_v2/Corridors_v5_Latest.xlsx").with_suffix(".qs")
-# Save the corridors object to the .qs file
-joblib.dump(corridors, qs_filename, compress=('zlib', 3))
+artifact_store.put_artifact(corridors, mrf.conf["bucket"], Path(feather_filename).name, local_path=feather_filename)
 
 # All corridors
 all_corridors = configs.get_corridors("/Users/achyuthpothuganti/Downloads/flex_v2/Corridors_v5_Latest.xlsx", filter_signals=False)
 
 feather_filename_all = str(Path("all_" + mrf.conf["corridors_filename_s3"]).with_suffix(".feather"))
-feather.write_feather(all_corridors, feather_filename_all)
-
-qs_filename_all = Path("all_" + mrf.conf["corridors_filename_s3"]).with_suffix(".qs")
-# Save the corridors object to the .qs file
-joblib.dump(corridors, qs_filename, compress=('zlib', 3))
+artifact_store.put_artifact(all_corridors, mrf.conf["bucket"], feather_filename_all, local_path=feather_filename_all)
 
 # ----- SIGNAL LIST FOR GIVEN DATE RANGE -----
-date_range = list(rrule(DAILY, dtstart=start_date, until=date_parse(end_date)))
-
-
-with ProcessPoolExecutor(max_workers=usable_cores) as executor:
-    signals_flat = list(executor.map(parallel_signal_fetch, date_range))
-
-signals_list = list(set([signal for sublist in signals_flat for signal in sublist]))
+signals_list = util.get_signals_list(mrf.conf["bucket"], start_date, end_date)
 
 # ----- SAVE LATEST DETECTOR CONFIG TO S3 -----
 latest_config = configs.get_latest_det_config(mrf.conf)
-util.s3write_using_qsave(latest_config, bucket=mrf.conf["bucket"], object_key="ATSPM_Det_Config_Good_Latest.qs")
+artifact_store.put_artifact(latest_config, mrf.conf["bucket"], "ATSPM_Det_Config_Good_Latest.feather")
 
 # ----- HANDLE ATHENA PARTITIONS -----
 athena = dbf.get_athena_connection(mrf.conf["athena"])
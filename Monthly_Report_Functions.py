@@ -86,6 +86,28 @@ from map import *
 from teams import *
 from aggregations import *
 from database_functions import *
+import memory_profile
 
 # Number of parallel threads/cores
 usable_cores = get_usable_cores()
+
+# Local disk cache for S3 parquet reads, e.g.
+# parquet_cache:
+#     cache_dir: /mnt/nvme/parquet_cache
+#     max_gb: 200
+if conf.get("parquet_cache"):
+    configure_cache(**conf["parquet_cache"])
+
+# Per-table parquet writer settings, see s3_parquet_io.DEFAULT_WRITER_PROFILE
+if conf.get("parquet_writer_profiles"):
+    configure_writer_profiles(conf["parquet_writer_profiles"])
+
+# Memory budget per chunk of signals, see utilities.get_signals_chunks, e.g.
+# signal_chunks:
+#     memory_budget_mb: 512
+if conf.get("signal_chunks"):
+    configure_signal_chunks(**conf["signal_chunks"])
+
+# Opt-in per-stage memory report, see memory_profile.enable
+if conf.get("memory_profile"):
+    memory_profile.enable(**conf["memory_profile"])
@@ -11,8 +11,14 @@ import Monthly_Report_Functions as mrf
 import Monthly_Report_Calcs_init_bkp as mr_init
 import s3_parquet_io as s3_io
 import aggregations as agg
+import configs
 import metrics
 import utilities as utils
+import memory_profile
+from calendar_dim import calendar_columns
+import daily_partials
+import duckdb_backend
+import artifact_store
 
 
 def save_to_rds(df, filename, metric_name, report_start_date, calcs_start_date):
@@ -60,18 +66,36 @@ def process_detector_uptime():
     print(f"{datetime.now()} Vehicle Detector Uptime [1 of 29 (mark1)]")
     
     try:
-        # Read detector uptime data
-        avg_daily_detector_uptime = s3_io.s3_read_parquet_parallel(
-            bucket=mrf.conf['bucket'],
-            table_name="detector_uptime_pd",
-            start_date=mr_init.wk_calcs_start_date,
-            end_date=mr_init.report_end_date,
-            signals_list=mr_init.signals_list,
-            callback=get_avg_daily_detector_uptime
-        )
+        if duckdb_backend.enabled(mrf.conf):
+            # Aggregated in DuckDB over detector_uptime_pd; only the daily result is loaded
+            avg_daily_detector_uptime = duckdb_backend.daily_avg(
+                "detector_uptime_pd", "uptime",
+                mr_init.wk_calcs_start_date, mr_init.report_end_date,
+                bucket=mrf.conf['bucket'], signals_list=mr_init.signals_list, conf=mrf.conf
+            )[['SignalID', 'Date', 'uptime']]
+        else:
+            # Daily detector uptime from the partials store, per signal, detector
+            # and day; only days whose raw detector_uptime_pd objects changed are read
+            daily_partials.update_partials(
+                "detector_uptime_pd", "detector_uptime_pd",
+                start_date=mr_init.wk_calcs_start_date,
+                end_date=mr_init.report_end_date,
+                keys=['SignalID', 'Detector'],
+                var_='uptime',
+                bucket=mrf.conf['bucket']
+            )
+            uptime_partials = daily_partials.read_partials(
+                "detector_uptime_pd", mr_init.wk_calcs_start_date, mr_init.report_end_date,
+                bucket=mrf.conf['bucket'], signals_list=mr_init.signals_list
+            )
+            avg_daily_detector_uptime = daily_partials.rollup_partials(
+                uptime_partials, ['SignalID', 'Date'], 'uptime'
+            )[['SignalID', 'Date', 'uptime']]
+            del uptime_partials
         
         avg_daily_detector_uptime['Date'] = pd.to_datetime(avg_daily_detector_uptime['Date'])
         avg_daily_detector_uptime['SignalID'] = avg_daily_detector_uptime['SignalID'].astype('category')
+        memory_profile.track("avg_daily_detector_uptime", avg_daily_detector_uptime)
         
         # Calculate corridor averages
         cor_avg_daily_detector_uptime = agg.get_cor_avg_daily_detector_uptime(
@@ -152,18 +176,19 @@ def process_ped_pushbutton_uptime():
             start_date=pau_start_date,
             end_date=mr_init.report_end_date,
             signals_list=mr_init.signals_list,
-            parallel=False
+            columns=['SignalID', 'Timeperiod', 'Detector', 'CallPhase', 'vol'],
+            arrow=True
         )
         
         # Clean and process data
+        # SignalID, Detector and CallPhase are already categorical from the Arrow read
         counts_ped_hourly = counts_ped_hourly.dropna(subset=['CallPhase'])
-        counts_ped_hourly['SignalID'] = counts_ped_hourly['SignalID'].astype('category')
-        counts_ped_hourly['Detector'] = counts_ped_hourly['Detector'].astype('category')
-        counts_ped_hourly['CallPhase'] = counts_ped_hourly['CallPhase'].astype('category')
-        counts_ped_hourly['Date'] = pd.to_datetime(counts_ped_hourly['Date']).dt.date
-        counts_ped_hourly['DOW'] = pd.to_datetime(counts_ped_hourly['Date']).dt.dayofweek
-        counts_ped_hourly['Week'] = pd.to_datetime(counts_ped_hourly['Date']).dt.isocalendar().week
+        calendar = calendar_columns(counts_ped_hourly['Date'], ['Date', 'DOW', 'Week'])
+        counts_ped_hourly['Date'] = calendar['Date']
+        counts_ped_hourly['DOW'] = calendar['DOW'] - 1  # 0 = Monday, as before
+        counts_ped_hourly['Week'] = calendar['Week']
         counts_ped_hourly['vol'] = pd.to_numeric(counts_ped_hourly['vol'])
+        memory_profile.track("counts_ped_hourly", counts_ped_hourly)
         
         # Calculate daily pedestrian activations
         counts_ped_daily = counts_ped_hourly.groupby([
@@ -178,6 +203,8 @@ def process_ped_pushbutton_uptime():
         dates = pd.date_range(start=pau_start_date, end=mr_init.report_end_date, freq='D')
         pau = get_pau_gamma(dates, papd, paph, mr_init.corridors, 
                            mr_init.wk_calcs_start_date, pau_start_date)
+        memory_profile.track("paph", paph)
+        memory_profile.track("pau", pau)
         
         # Filter and replace bad data
         pau['papd'] = np.where(pau['uptime'] == 1, pau['papd'], np.nan)
@@ -197,8 +224,7 @@ def process_ped_pushbutton_uptime():
                 bucket=mrf.conf['bucket'],
                 prefix="bad_ped_detectors",
                 table_name="bad_ped_detectors",
-                conf_athena=mrf.conf['athena'],
-                parallel=False
+                conf_athena=mrf.conf['athena']
             )
         
         # Save pedestrian uptime data
@@ -262,6 +288,8 @@ def process_watchdog_alerts():
     print(f"{datetime.now()} watchdog alerts [3 of 29 (mark1)]")
     
     try:
+        alerts = []
+        
         # Process vehicle detector alerts
         bad_det = s3_io.s3_read_parquet_parallel(
             "bad_detectors",
@@ -272,6 +300,7 @@ def process_watchdog_alerts():
         
         bad_det['SignalID'] = bad_det['SignalID'].astype('category')
         bad_det['Detector'] = bad_det['Detector'].astype('category')
+        memory_profile.track("bad_det", bad_det)
         
         # Get detector configuration for each date
         unique_dates = sorted(bad_det['Date'].unique())
@@ -293,11 +322,11 @@ def process_watchdog_alerts():
             bad_det = bad_det.merge(det_config, on=['SignalID', 'Detector', 'Date'], how='left')
             
             # Join with corridor information
-            corridors_subset = mr_init.corridors[['Zone_Group', 'Zone', 'Corridor', 'SignalID', 'Name']]
-            bad_det = bad_det.merge(corridors_subset, on='SignalID', how='left')
+            corridor_dim = configs.corridor_dimension(mr_init.corridors)
+            bad_det = corridor_dim.attach(bad_det, ['Zone_Group', 'Zone', 'Corridor', 'Name'])
             
-            # Filter and format
-            bad_det = bad_det.dropna(subset=['Corridor'])
+            # Format
+            bad_det['Name'] = bad_det['Name'].astype(object)
             bad_det['Alert'] = 'Bad Vehicle Detection'
             bad_det['Name'] = bad_det['Name'].str.replace('@', '-').where(
                 bad_det['Corridor'] == 'Ramp Meter', bad_det['Name']
@@ -319,6 +348,7 @@ def process_watchdog_alerts():
                 object="mark/watchdog/bad_detectors.parquet",
                 write_func='parquet'
             )
+            alerts.append(bad_det)
         
         # Process pedestrian detector alerts
         bad_ped = s3_io.s3_read_parquet_parallel(
@@ -333,7 +363,9 @@ def process_watchdog_alerts():
             bad_ped['Detector'] = bad_ped['Detector'].astype('category')
             
             # Join with corridor information
-            bad_ped = bad_ped.merge(corridors_subset, on='SignalID', how='left')
+            bad_ped = configs.corridor_dimension(mr_init.corridors).attach(
+                bad_ped, ['Zone_Group', 'Zone', 'Corridor', 'Name'], dropna=False
+            )
             bad_ped['Alert'] = 'Bad Ped Detection'
             
             bad_ped = bad_ped[[
@@ -347,10 +379,17 @@ def process_watchdog_alerts():
                 object="mark/watchdog/bad_ped_pushbuttons.parquet",
                 write_func='parquet'
             )
+            alerts.append(bad_ped)
         
         # Process CCTV alerts (placeholder)
         # Implementation would depend on specific CCTV data structure
         
+        # All alerts in one artifact for the dashboard (Monthly_Report_UI_Functions.alerts)
+        if alerts:
+            artifact_store.put_artifact(
+                pd.concat(alerts, ignore_index=True), mrf.conf['bucket'], "mark/watchdog/alerts.feather"
+            )
+        
         print("Watchdog alerts processed successfully")
         
     except Exception as e:
@@ -379,16 +418,19 @@ def main():
     print(f"{datetime.now()} Starting Monthly Report Package 1")
     
     # Section 1: Vehicle Detector Uptime
-    process_detector_uptime()
-    gc.collect()
+    with memory_profile.stage("detector_uptime"):
+        process_detector_uptime()
+        gc.collect()
     
     # Section 2: Pedestrian Pushbutton Uptime
-    process_ped_pushbutton_uptime()
-    gc.collect()
+    with memory_profile.stage("ped_pushbutton_uptime"):
+        process_ped_pushbutton_uptime()
+        gc.collect()
     
     # Section 3: Watchdog Alerts
-    process_watchdog_alerts()
-    gc.collect()
+    with memory_profile.stage("watchdog_alerts"):
+        process_watchdog_alerts()
+        gc.collect()
     
     # Placeholder sections (implement as needed)
     sections = [
@@ -417,8 +459,9 @@ def main():
     ]
     
     for section_name, section_number in sections:
-        process_placeholder_section(section_name, section_number)
-        gc.collect()
+        with memory_profile.stage(section_name):
+            process_placeholder_section(section_name, section_number)
+            gc.collect()
     
     print(f"{datetime.now()} Monthly Report Package 1 completed")
 
@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 import pandas as pd
 import boto3
 import plotly.graph_objects as go
@@ -6,6 +7,7 @@ from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from dash import html
 from shared_functions import conf, aws_conf
+import artifact_store
 
 # Constants for Corridor Summary Table
 LIGHT_BLUE = "#A6CEE3"
@@ -148,8 +150,9 @@ def s3_value_func(bucket, object_key, aws_conf):
 
 
 
-# AWS S3 reactive poll function
-def s3_reactive_poll(bucket, object_key, aws_conf, interval_seconds):
+# AWS S3 reactive poll function. With load, value() returns load(bucket, object_key)
+# instead of the raw bytes, e.g. artifact_store.get_artifact for frames written by put_artifact.
+def s3_reactive_poll(bucket, object_key, aws_conf, interval_seconds, load=None):
     s3 = boto3.client(
         "s3",
         aws_access_key_id=aws_conf["AWS_ACCESS_KEY_ID"],
@@ -161,6 +164,8 @@ def s3_reactive_poll(bucket, object_key, aws_conf, interval_seconds):
         return response["Contents"][0]["LastModified"] if "Contents" in response else None
 
     def value():
+        if load is not None:
+            return load(bucket, object_key)
         response = s3.get_object(Bucket=bucket, Key=object_key)
         return response["Body"].read()
 
@@ -168,10 +173,13 @@ def s3_reactive_poll(bucket, object_key, aws_conf, interval_seconds):
 
 # Example usage
 poll_interval = 3600  # 1 hour
-corridors_key = f"all_{conf['corridors_filename_s3']}.qs"
-corridors = s3_reactive_poll(conf["bucket"], corridors_key, aws_conf, poll_interval)
+# Written by Monthly_Report_Calcs_init and Monthly_Report_Package_1 with artifact_store.put_artifact
+corridors_key = str(Path("all_" + conf["corridors_filename_s3"]).with_suffix(".feather"))
+corridors = s3_reactive_poll(conf["bucket"], corridors_key, aws_conf, poll_interval,
+                             load=artifact_store.get_artifact)
 
-alerts = s3_reactive_poll(conf["bucket"], "mark/watchdog/alerts.qs", aws_conf, poll_interval)
+alerts = s3_reactive_poll(conf["bucket"], "mark/watchdog/alerts.feather", aws_conf, poll_interval,
+                          load=artifact_store.get_artifact)
 
 # Read zipped feather file
 def read_zipped_feather(file_path):
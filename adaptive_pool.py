@@ -0,0 +1,159 @@
+# adaptive_pool.py
+
+import os
+import json
+import time
+import datetime
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import psutil
+
+from pipeline import PipelineError
+
+# Worker counts and measured task memory per stage, read back on the next run
+WORKER_SETTINGS_FILE = "worker_settings.json"
+
+MB = 1024 ** 2
+
+
+def load_worker_settings(settings_file=WORKER_SETTINGS_FILE):
+    try:
+        with open(settings_file) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_worker_settings(stage, settings, settings_file=WORKER_SETTINGS_FILE):
+    all_settings = load_worker_settings(settings_file)
+    all_settings[stage] = settings
+    tmp = f"{settings_file}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(all_settings, f, indent=2)
+    os.replace(tmp, settings_file)
+
+
+class _MemorySampler(threading.Thread):
+    """
+    Samples the memory of the pool's worker processes and keeps the largest
+    seen. USS is used rather than RSS: a forked worker's RSS also counts the
+    pages it still shares with the parent, which overstates what a task takes.
+    """
+
+    def __init__(self, interval=0.25):
+        super().__init__(name="adaptive_pool_sampler", daemon=True)
+        self.interval = interval
+        self.peak_task_uss = 0
+        self.workers_uss = 0
+        self._finished = threading.Event()
+        self._process = psutil.Process()
+
+    def sample(self):
+        total = 0
+        for child in self._process.children(recursive=True):
+            try:
+                uss = child.memory_full_info().uss
+            except psutil.Error:
+                continue
+            total += uss
+            self.peak_task_uss = max(self.peak_task_uss, uss)
+        self.workers_uss = total
+
+    def run(self):
+        while not self._finished.is_set():
+            self.sample()
+            self._finished.wait(self.interval)
+
+    def stop(self):
+        self._finished.set()
+        self.join()
+
+
+def fit_workers(task_mem, workers_mem, max_workers, memory_fraction):
+    """Number of workers of task_mem bytes each that fit under the memory ceiling."""
+    vm = psutil.virtual_memory()
+    ceiling = vm.total * memory_fraction
+    # Memory in use by everything other than the pool's workers
+    used_by_others = max(0, vm.total - vm.available - workers_mem)
+    return max(1, min(max_workers, int((ceiling - used_by_others) // max(task_mem, 1))))
+
+
+def run_adaptive(stage, func, items, max_workers=None, memory_fraction=0.8, settings_file=WORKER_SETTINGS_FILE):
+    """
+    Maps func over items in a process pool whose concurrency follows measured
+    task memory rather than a fixed worker count.
+
+    Without settings for `stage` from an earlier run, two tasks run first while
+    the peak memory of the worker processes is sampled. After each completed
+    task the number of workers is refitted so that they stay under
+    memory_fraction of total RAM: it grows by at most a factor of two per step
+    and shrinks at once. The pool is sized to that number and replaced when it
+    changes, so idle workers holding their peak memory do not outlive a
+    shrink. The chosen worker count and task peak are recorded in
+    settings_file to seed the next run of the stage.
+
+    func must be picklable (module-level). Returns results in item order. A
+    failed task is printed and the remaining items still run; once all are
+    done a PipelineError listing the failures is raised.
+    """
+    items = list(items)
+    max_workers = max(1, max_workers or os.cpu_count())
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    recorded = load_worker_settings(settings_file).get(stage, {})
+    limit = max(1, min(max_workers, recorded.get("workers", 2)))
+    recorded_task_mem = recorded.get("peak_task_mb", 0) * MB
+
+    sampler = _MemorySampler()
+    sampler.start()
+    start = time.time()
+    pending = {}
+    failures = []
+    next_i = 0
+    executor = ProcessPoolExecutor(max_workers=limit)
+    try:
+        while next_i < len(items) or pending:
+            while next_i < len(items) and len(pending) < limit:
+                pending[executor.submit(func, items[next_i])] = next_i
+                next_i += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    print(f"[{stage}] Task for {items[i]} failed: {e}")
+                    failures.append((stage, items[i], e))
+
+            sampler.sample()
+            task_mem = sampler.peak_task_uss or recorded_task_mem
+            if task_mem:
+                fitted = fit_workers(task_mem, sampler.workers_uss, max_workers, memory_fraction)
+                new_limit = min(fitted, limit * 2)
+                if new_limit != limit:
+                    print(f"[{stage}] {limit} -> {new_limit} workers "
+                          f"(peak task {task_mem / MB:.0f} MB)")
+                    limit = new_limit
+                    # Tasks in flight finish on the old pool, whose workers then exit
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=limit)
+    finally:
+        executor.shutdown(wait=True)
+        sampler.stop()
+
+    task_mem = sampler.peak_task_uss or recorded_task_mem
+    save_worker_settings(stage, {
+        "workers": limit,
+        "peak_task_mb": round(task_mem / MB),
+        "max_workers": max_workers,
+        "memory_fraction": memory_fraction,
+        "seconds": round(time.time() - start, 1),
+        "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+    }, settings_file)
+    if failures:
+        raise PipelineError(failures)
+    return results
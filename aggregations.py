@@ -1,104 +1,143 @@
 import yaml
+import numpy as np
 import pandas as pd
+from calendar_dim import attach_calendar, calendar_columns
+from configs import corridor_dimension
 with open("Monthly_Report.yaml", "r") as file:
-    config = yaml.safe_load(file)
+    config = yaml.safe_load(file) or {}
+
+AM_PEAK_HOURS = config.get("AM_PEAK_HOURS", [])
+PM_PEAK_HOURS = config.get("PM_PEAK_HOURS", [])
+
+def weighted_mean(df, by, var_, wt_):
+    """
+    Weighted mean of var_ by wt_ and total weight per group, as one groupby
+    sum over var_*wt_ and wt_. Returns the group columns, var_ and wt_.
+    """
+    sums = (df[by].assign(_weighted=df[var_] * df[wt_], _weight=df[wt_])
+            .groupby(by, observed=True)[["_weighted", "_weight"]].sum())
+    result = pd.DataFrame({var_: sums["_weighted"] / sums["_weight"], wt_: sums["_weight"]})
+    return result.reset_index()
+
+def grouped_lag(df, var_, by, order):
+    """
+    Previous value of var_ within each group of `by` columns, in `order`
+    column order, aligned to the rows of df. The first row of each group gets
+    NaN rather than the last value of the group before it. One sort and a
+    shift, with group boundaries masked, instead of a groupby-apply.
+    """
+    by, keys = list(by), list(by) + list(order)
+    frame = df[keys].reset_index(drop=True)
+    frame["_value"] = df[var_].to_numpy(dtype="float64", na_value=np.nan)
+    frame = frame.sort_values(keys, kind="stable")
+    lag = frame["_value"].shift()
+    if by:
+        lag[frame[by].ne(frame[by].shift()).any(axis=1)] = np.nan
+    return pd.Series(lag.sort_index().to_numpy(), index=df.index)
+
+def add_delta(df, var_, by, order):
+    """Adds lag_ and the relative change delta of var_ from the previous period of the same entity."""
+    df["lag_"] = grouped_lag(df, var_, by, order)
+    df["delta"] = (df[var_] - df["lag_"]) / df["lag_"]
+    return df
 
 def weighted_mean_by_corridor_(df, per_, corridors, var_, wt_=None):
-    df = df.merge(corridors, how="left", on="SignalID")
-    df = df[df["Corridor"].notna()]
-    df["Corridor"] = pd.Categorical(df["Corridor"])
-
-    grouped = df.groupby(["Zone_Group", "Zone", "Corridor", per_])
+    df = corridor_dimension(corridors).attach(df, ["Zone_Group", "Zone", "Corridor"])
 
     if wt_ is None:
-        result = grouped[var_].mean().reset_index()
-        result["lag_"] = result[var_].shift()
-        result["delta"] = (result[var_] - result["lag_"]) / result["lag_"]
+        result = df.groupby(["Zone_Group", "Zone", "Corridor", per_], observed=True)[var_].mean().reset_index()
+        add_delta(result, var_, ["Zone_Group", "Zone", "Corridor"], [per_])
         return result[["Zone_Group", "Zone", "Corridor", per_, var_, "delta"]]
     else:
-        result = grouped.apply(lambda x: pd.Series({
-            var_: (x[var_] * x[wt_]).sum() / x[wt_].sum(),
-            wt_: x[wt_].sum()
-        })).reset_index()
-        result["lag_"] = result[var_].shift()
-        result["delta"] = (result[var_] - result["lag_"]) / result["lag_"]
+        result = weighted_mean(df, ["Zone_Group", "Zone", "Corridor", per_], var_, wt_)
+        add_delta(result, var_, ["Zone_Group", "Zone", "Corridor"], [per_])
         return result[["Zone_Group", "Zone", "Corridor", per_, var_, wt_, "delta"]]
 
 def group_corridor_by_(df, per_, var_, wt_, corr_grp):
-    grouped = df.groupby(per_)
-    result = grouped.apply(lambda x: pd.Series({
-        var_: (x[var_] * x[wt_]).sum() / x[wt_].sum(),
-        wt_: x[wt_].sum()
-    })).reset_index()
+    result = weighted_mean(df, [per_], var_, wt_)
     result["Corridor"] = corr_grp
-    result["lag_"] = result[var_].shift()
-    result["delta"] = (result[var_] - result["lag_"]) / result["lag_"]
+    add_delta(result, var_, [], [per_])
     result["Zone_Group"] = corr_grp
     return result[["Zone_Group", "Corridor", per_, var_, wt_, "delta"]]
 
-def group_corridors_(df, per_, var_, wt_, gr_=group_corridor_by_):
-    zones = df.groupby("Zone")
-    all_zones = [gr_(zones.get_group(zone), per_, var_, wt_, zone) for zone in zones.groups]
-
-    all_rtop = gr_(df[df["Zone_Group"].isin(["RTOP1", "RTOP2"])], per_, var_, wt_, "All RTOP")
-    all_rtop1 = gr_(df[df["Zone_Group"] == "RTOP1"], per_, var_, wt_, "RTOP1")
-    all_rtop2 = gr_(df[df["Zone_Group"] == "RTOP2"], per_, var_, wt_, "RTOP2")
-    all_zone7 = gr_(df[df["Zone"].isin(["Zone 7m", "Zone 7d"])], per_, var_, wt_, "Zone 7")
+# Groups that group_corridors_ adds above the per-zone rollups:
+# name -> (corridor column, member values)
+ZONE_ROLLUPS = {
+    "All RTOP": ("Zone_Group", ["RTOP1", "RTOP2"]),
+    "RTOP1": ("Zone_Group", ["RTOP1"]),
+    "RTOP2": ("Zone_Group", ["RTOP2"]),
+    "Zone 7": ("Zone", ["Zone 7m", "Zone 7d"]),
+}
+
+def group_corridors_(df, per_, var_, wt_, gr_=None, rollups=ZONE_ROLLUPS):
+    """
+    Adds a weighted-mean row per period for every Zone and every group in
+    `rollups` to the corridor rows of df. Sums of var_*wt_ and wt_ are taken
+    once per (Zone_Group, Zone, period) and each group is summed from those
+    partials, rather than re-filtering and re-aggregating df per group.
+    A custom gr_(subset, per_, var_, wt_, name) is applied per subset instead.
+    As before, duplicate rows of the result (e.g. corridor rows repeated in
+    df) are dropped.
+    """
+    if gr_ is not None:
+        groups = [gr_(subset, per_, var_, wt_, zone) for zone, subset in df.groupby("Zone", observed=True)]
+        groups += [gr_(df[df[col].isin(members)], per_, var_, wt_, name)
+                   for name, (col, members) in rollups.items()]
+        return pd.concat([df[["Corridor", "Zone", per_, var_, wt_, "delta"]], *groups]).drop_duplicates()
+
+    # dropna=False keeps rows without a Zone_Group in the partials of their Zone
+    partials = (df[["Zone_Group", "Zone", per_]]
+                .assign(_weighted=df[var_] * df[wt_], _weight=df[wt_])
+                .groupby(["Zone_Group", "Zone", per_], observed=True, dropna=False)[["_weighted", "_weight"]].sum()
+                .reset_index())
+
+    def rollup(parts, name):
+        sums = parts.groupby(per_, observed=True)[["_weighted", "_weight"]].sum()
+        return pd.DataFrame({"Corridor": name, per_: sums.index, var_: (sums["_weighted"] / sums["_weight"]).values,
+                             wt_: sums["_weight"].values, "Zone_Group": name})
+
+    groups = [rollup(parts, zone) for zone, parts in partials.groupby("Zone", observed=True)]
+    groups += [rollup(partials[partials[col].isin(members)], name) for name, (col, members) in rollups.items()]
+    groups = pd.concat(groups, ignore_index=True)
+    add_delta(groups, var_, ["Corridor"], [per_])
 
     return pd.concat([df[["Corridor", "Zone", per_, var_, wt_, "delta"]],
-                      *all_zones, all_rtop, all_rtop1, all_rtop2, all_zone7]).drop_duplicates()
+                      groups[["Zone_Group", "Corridor", per_, var_, wt_, "delta"]]]).drop_duplicates()
 
 def get_hourly(df, var_, corridors):
-    df = df.merge(corridors, how="left", on="SignalID")
-    df = df[df["Corridor"].notna()]
-    df["lag_"] = df[var_].shift()
-    df["delta"] = (df[var_] - df["lag_"]) / df["lag_"]
+    df = corridor_dimension(corridors).attach(df, ["Zone_Group", "Zone", "Corridor", "Subcorridor"])
+    add_delta(df, var_, ["SignalID"], ["Hour"])
     return df[["SignalID", "Hour", var_, "delta", "Zone_Group", "Zone", "Corridor", "Subcorridor"]]
 
 def get_period_avg(df, var_, per_, wt_="ones"):
     if wt_ == "ones":
-        df[wt_] = 1
+        df = df.assign(ones=1)
 
-    grouped = df.groupby(["SignalID", per_])
-    result = grouped.apply(lambda x: pd.Series({
-        var_: (x[var_] * x[wt_]).sum() / x[wt_].sum(),
-        wt_: x[wt_].sum()
-    })).reset_index()
-    result["lag_"] = result[var_].shift()
-    result["delta"] = (result[var_] - result["lag_"]) / result["lag_"]
+    result = weighted_mean(df, ["SignalID", per_], var_, wt_)
+    add_delta(result, var_, ["SignalID"], [per_])
     return result[["SignalID", per_, var_, wt_, "delta"]]
 
 def get_period_sum(df, var_, per_):
     grouped = df.groupby(["SignalID", per_])
     result = grouped[var_].sum().reset_index()
-    result["lag_"] = result[var_].shift()
-    result["delta"] = (result[var_] - result["lag_"]) / result["lag_"]
+    add_delta(result, var_, ["SignalID"], [per_])
     return result[["SignalID", per_, var_, "delta"]]
 
 def get_daily_avg(df, var_, wt_="ones", peak_only=False):
     if wt_ == "ones":
-        df[wt_] = 1
+        df = df.assign(ones=1)
 
     if peak_only:
-        df = df[df["Date_Hour"].dt.hour.isin(AM_PEAK_HOURS + PM_PEAK_HOURS)]
-
-    grouped = df.groupby(["SignalID", "Date"])
-    result = grouped.apply(lambda x: pd.Series({
-        var_: (x[var_] * x[wt_]).sum() / x[wt_].sum(),
-        wt_: x[wt_].sum()
-    })).reset_index()
-    result["lag_"] = result[var_].shift()
-    result["delta"] = (result[var_] - result["lag_"]) / result["lag_"]
+        peak = calendar_columns(df["Date_Hour"], ["Peak"], AM_PEAK_HOURS, PM_PEAK_HOURS)["Peak"]
+        df = df[peak.fillna(False).astype(bool)]
+
+    result = weighted_mean(df, ["SignalID", "Date"], var_, wt_)
+    add_delta(result, var_, ["SignalID"], ["Date"])
     return result[["SignalID", "Date", var_, wt_, "delta"]]
 
 def get_daily_avg_cctv(df, var_="uptime", wt_="num", peak_only=False):
-    grouped = df.groupby(["CameraID", "Date"])
-    result = grouped.apply(lambda x: pd.Series({
-        var_: (x[var_] * x[wt_]).sum() / x[wt_].sum(),
-        wt_: x[wt_].sum()
-    })).reset_index()
-    result["lag_"] = result[var_].shift()
-    result["delta"] = (result[var_] - result["lag_"]) / result["lag_"]
+    result = weighted_mean(df, ["CameraID", "Date"], var_, wt_)
+    add_delta(result, var_, ["CameraID"], ["Date"])
     return result[["CameraID", "Date", var_, wt_, "delta"]]
 
 def get_vph(counts, interval="1 hour", mainline_only=True):
@@ -111,8 +150,8 @@ def get_vph(counts, interval="1 hour", mainline_only=True):
         counts = counts.rename(columns={datetime_cols[0]: "Timeperiod"})
 
     # Group by SignalID, Week, DOW, and Timeperiod, and calculate the sum of vol
-    counts["Week"] = counts["Timeperiod"].dt.isocalendar().week
-    counts["DOW"] = counts["Timeperiod"].dt.dayofweek + 1  # Day of week (1 = Monday, ..., 7 = Sunday)
+    # Day of week from the calendar dimension: 1 = Monday, ..., 7 = Sunday
+    counts = attach_calendar(counts, "Timeperiod", ["Week", "DOW"])
     grouped = counts.groupby(["SignalID", "Week", "DOW", "Timeperiod"], as_index=False)["vol"].sum()
     grouped = grouped.rename(columns={"vol": "vph"})
 
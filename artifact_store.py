@@ -0,0 +1,105 @@
+# artifact_store.py
+
+import os
+import uuid
+import hashlib
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from botocore.exceptions import ClientError
+
+import retry
+
+# Artifacts are Arrow IPC files (readable as feather v2) compressed with this codec on S3
+ARTIFACT_CODEC = "zstd"
+
+# Local copies are kept uncompressed so they can be memory-mapped without a
+# decode, and so processes loading the same artifact share the page cache.
+ARTIFACT_CACHE_DIR = os.path.expanduser("~/.cache/flex_artifacts")
+
+HASH_METADATA_KEY = "content-sha256"
+
+
+def _s3():
+    # Local import to avoid circular dependency
+    from s3_parquet_io import get_s3_client
+    return get_s3_client()
+
+
+def serialize_frame(df, codec=ARTIFACT_CODEC):
+    """Serializes a DataFrame or Arrow table to an in-memory Arrow IPC file."""
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with ipc.new_file(sink, table.schema, options=ipc.IpcWriteOptions(compression=codec)) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def deserialize_frame(source):
+    """Reads an Arrow IPC file from a buffer, bytes or memory map into an Arrow table."""
+    if isinstance(source, bytes):
+        source = pa.py_buffer(source)
+    return ipc.open_file(source).read_all()
+
+
+def put_artifact(df, bucket, key, codec=ARTIFACT_CODEC, local_path=None):
+    """
+    Uploads a frame to s3://bucket/key as a compressed Arrow IPC file,
+    serialized in memory. The SHA-256 of the serialized bytes is stored in
+    the object metadata and the upload is skipped when it is unchanged.
+    With local_path the same bytes are also written there.
+    Returns True if the object was uploaded.
+    """
+    buf = serialize_frame(df, codec)
+    digest = hashlib.sha256(buf).hexdigest()
+
+    if local_path:
+        with open(local_path, "wb") as f:
+            f.write(buf)
+
+    s3 = _s3()
+    try:
+        head = retry.call("s3", s3.head_object, Bucket=bucket, Key=key)
+        if head.get("Metadata", {}).get(HASH_METADATA_KEY) == digest:
+            print(f"{key} unchanged, not uploaded")
+            return False
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+            raise
+
+    retry.call("s3", s3.put_object, Bucket=bucket, Key=key, Body=buf.to_pybytes(),
+               Metadata={HASH_METADATA_KEY: digest})
+    print(f"Uploaded {key} ({buf.size / 1024 ** 2:.1f} MB)")
+    return True
+
+
+def _local_copy(bucket, key, cache_dir):
+    """Returns the path of an uncompressed local copy of the current version of an artifact."""
+    s3 = _s3()
+    etag = retry.call("s3", s3.head_object, Bucket=bucket, Key=key)["ETag"].strip('"')
+    cache_dir = Path(cache_dir)
+    path = cache_dir / f"{hashlib.sha1(f'{bucket}/{key}/{etag}'.encode()).hexdigest()}.arrow"
+    if path.exists():
+        return path
+
+    body = retry.call("s3", lambda: s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    table = deserialize_frame(body)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    with pa.OSFile(str(tmp), "wb") as f:
+        with ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+    return path
+
+
+def get_artifact(bucket, key, cache_dir=ARTIFACT_CACHE_DIR, as_arrow=False):
+    """
+    Loads an artifact written by put_artifact (or any feather v2 file) by
+    memory-mapping an uncompressed local copy, refreshed when the S3 object's
+    ETag changes. Returns a DataFrame, or the Arrow table with as_arrow=True.
+    """
+    path = _local_copy(bucket, key, cache_dir)
+    table = deserialize_frame(pa.memory_map(str(path), "r"))
+    return table if as_arrow else table.to_pandas()
@@ -0,0 +1,90 @@
+# calendar_dim.py
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar
+
+# Columns of the calendar dimension, one row per hour:
+# Date, Hour, Year, Quarter, Month, Week (ISO), DOW (1 = Monday ... 7 = Sunday),
+# TWR (Tue/Wed/Thu), Holiday (US federal), AM_Peak, PM_Peak, Peak
+CALENDAR_COLUMNS = ["Date", "Hour", "Year", "Quarter", "Month", "Week", "DOW", "TWR", "Holiday",
+                    "AM_Peak", "PM_Peak", "Peak"]
+
+NS_PER_HOUR = 3600 * 10 ** 9
+
+
+def hour_keys(ts):
+    """
+    Integer key of each timestamp: hours since 1970-01-01 in wall-clock time,
+    and a mask of the rows that are not NaT.
+    """
+    ts = pd.Series(ts)
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts)
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_localize(None)
+    ns = ts.to_numpy(dtype="datetime64[ns]").view("int64")
+    valid = ns != np.iinfo("int64").min
+    return np.floor_divide(ns, NS_PER_HOUR), valid
+
+
+@lru_cache(maxsize=8)
+def get_calendar(first_year, last_year, am_peak_hours=(), pm_peak_hours=()):
+    """
+    The hourly calendar dimension for whole years first_year..last_year,
+    indexed by position: row i is hour i after Jan 1 of first_year.
+    """
+    hours = pd.date_range(f"{first_year}-01-01", f"{last_year}-12-31 23:00", freq="h")
+    days = hours.normalize()
+    holidays = USFederalHolidayCalendar().holidays(start=days[0], end=days[-1])
+    hour = hours.hour
+    dow = hours.dayofweek + 1
+    am_peak = np.isin(hour, am_peak_hours)
+    pm_peak = np.isin(hour, pm_peak_hours)
+    return pd.DataFrame({
+        "Date": days.date,
+        "Hour": hour.astype("int8"),
+        "Year": hours.year.astype("int16"),
+        "Quarter": hours.quarter.astype("int8"),
+        "Month": hours.month.astype("int8"),
+        "Week": hours.isocalendar().week.to_numpy().astype("int8"),
+        "DOW": dow.astype("int8"),
+        "TWR": np.isin(dow, [2, 3, 4]),
+        "Holiday": days.isin(holidays),
+        "AM_Peak": am_peak,
+        "PM_Peak": pm_peak,
+        "Peak": am_peak | pm_peak,
+    })
+
+
+def calendar_columns(ts, columns, am_peak_hours=(), pm_peak_hours=()):
+    """
+    Looks up calendar columns for a datetime Series by integer hour key: a
+    positional take from the cached calendar instead of deriving each field
+    per row. Returns a dict of Series aligned to ts. Rows with NaT get NaN.
+    """
+    ts = pd.Series(ts)
+    keys, valid = hour_keys(ts)
+    if not valid.any():
+        return {col: pd.Series(np.nan, index=ts.index) for col in columns}
+
+    first_year = pd.Timestamp(keys[valid].min() * NS_PER_HOUR).year
+    last_year = pd.Timestamp(keys[valid].max() * NS_PER_HOUR).year
+    calendar = get_calendar(first_year, last_year, tuple(am_peak_hours), tuple(pm_peak_hours))
+    first_key = pd.Timestamp(f"{first_year}-01-01").value // NS_PER_HOUR
+    positions = np.where(valid, keys - first_key, 0)
+
+    result = {}
+    for col in columns:
+        values = pd.Series(calendar[col].to_numpy()[positions], index=ts.index)
+        result[col] = values if valid.all() else values.where(valid)
+    return result
+
+
+def attach_calendar(df, time_col, columns, am_peak_hours=(), pm_peak_hours=()):
+    """Adds calendar columns for the timestamps in df[time_col]. Returns df."""
+    for col, values in calendar_columns(df[time_col], columns, am_peak_hours, pm_peak_hours).items():
+        df[col] = values
+    return df
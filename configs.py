@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import boto3
@@ -50,6 +51,94 @@ def get_corridors(corr_fn, filter_signals=True, mark_only=False):
         "Agency", "Name", "Asof", "Latitude", "Longitude", "Description"
     ]]
 
+def signal_id_array(s):
+    """
+    SignalIDs as an int64 array whatever their source dtype (float64 from the
+    corridors file, str from parquet, categorical). Missing or non-numeric
+    IDs become -1. Parsed once per distinct value.
+    """
+    s = pd.Series(s)
+    if pd.api.types.is_integer_dtype(s.dtype) and not s.hasnans:
+        return s.to_numpy(dtype="int64")
+    codes, uniques = pd.factorize(s)
+    ids = pd.to_numeric(pd.Series(uniques).astype(str).str.strip(), errors="coerce")
+    ids = ids.fillna(-1).to_numpy(dtype="int64")
+    return np.where(codes >= 0, ids[codes], -1)
+
+
+class CorridorDimension:
+    """
+    SignalID -> corridor attributes, built once per run. Attributes are held
+    as dense integer codes in SignalID order, so facts are joined with a
+    searchsorted and a positional take rather than a hash merge of the whole
+    fact table on SignalID. When a SignalID maps to more than one corridor
+    row, attach() falls back to a merge so rows are repeated as before.
+    """
+
+    ATTRIBUTES = ["Zone_Group", "Zone", "Corridor", "Subcorridor"]
+
+    def __init__(self, corridors):
+        ids = signal_id_array(corridors["SignalID"])
+        keep = ids >= 0
+        self.corridors = corridors[keep].assign(SignalID=ids[keep])
+        self.unique = self.corridors["SignalID"].is_unique
+        self.corridors = self.corridors.sort_values("SignalID", kind="stable").reset_index(drop=True)
+        self.signal_ids = self.corridors["SignalID"].to_numpy()
+        self._codes = {}
+        for col in self.ATTRIBUTES:
+            if col in self.corridors:
+                self.codes(col)
+
+    def codes(self, col):
+        """Integer codes (-1 for missing) and categories of a corridor column, in SignalID order."""
+        if col not in self._codes:
+            codes, categories = pd.factorize(self.corridors[col], sort=True)
+            self._codes[col] = (codes.astype("int32"), categories)
+        return self._codes[col]
+
+    def attach(self, df, columns=None, dropna=True):
+        """
+        Adds corridor columns (default: the ATTRIBUTES present) to df by
+        SignalID, as categoricals. With dropna, rows whose SignalID has no
+        corridor are dropped, as with a left merge followed by
+        Corridor.notna(). Returns a new DataFrame.
+        """
+        if columns is None:
+            columns = [col for col in self.ATTRIBUTES if col in self.corridors]
+        if not self.unique:
+            merged = df.merge(self.corridors[["SignalID"] + columns].rename(columns={"SignalID": "_signal_id"}),
+                              how="inner" if dropna else "left",
+                              left_on=signal_id_array(df["SignalID"]), right_on="_signal_id")
+            df = merged.drop(columns=["key_0", "_signal_id"], errors="ignore")
+            return df[df["Corridor"].notna()] if dropna and "Corridor" in columns else df
+
+        keys = signal_id_array(df["SignalID"])
+        positions = np.searchsorted(self.signal_ids, keys).clip(0, max(len(self.signal_ids) - 1, 0))
+        found = (self.signal_ids[positions] == keys) if len(self.signal_ids) else np.zeros(len(keys), bool)
+        if dropna:
+            df, positions, found = df[found], positions[found], found[found]
+        df = df.copy()
+        for col in columns:
+            codes, categories = self.codes(col)
+            df[col] = pd.Categorical.from_codes(np.where(found, codes[positions], -1), categories)
+        if dropna and "Corridor" in columns:
+            df = df[df["Corridor"].notna()]
+        return df
+
+
+_corridor_dimension = (None, None)
+
+
+def corridor_dimension(corridors):
+    """The CorridorDimension of a corridors DataFrame, built on first use and reused for the same frame."""
+    global _corridor_dimension
+    if isinstance(corridors, CorridorDimension):
+        return corridors
+    if _corridor_dimension[0] is not corridors:
+        _corridor_dimension = (corridors, CorridorDimension(corridors))
+    return _corridor_dimension[1]
+
+
 def check_corridors(corridors):
     distinct_corridors = corridors[["District", "Contract", "Corridor"]].drop_duplicates()
 
@@ -0,0 +1,160 @@
+# daily_partials.py
+
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+from botocore.exceptions import ClientError
+
+import retry
+import s3_parquet_io as s3_io
+
+# Partials of table <name> live at partials/<name>/date=YYYY-MM-DD/<name>_YYYY-MM-DD.parquet,
+# with partials/<name>/_manifest.json recording the raw objects each day was computed from
+PARTIALS_ROOT = "partials"
+
+PARTIAL_COLUMNS = ["sum", "weight", "count"]
+
+
+def compute_daily_partials(df, keys, var_, wt_=None):
+    """
+    Mergeable daily partial aggregates of var_ per keys and Date: the sum of
+    var_*wt_, the weight and the count of non-missing values. Without wt_
+    each non-missing value has weight 1, so sum / weight is the plain mean.
+    """
+    present = df[var_].notna()
+    weight = df[wt_].where(present, 0) if wt_ else present.astype("int64")
+    partials = (df[keys + ["Date"]]
+                .assign(sum=df[var_].fillna(0) * weight, weight=weight, count=present.astype("int64"))
+                .groupby(keys + ["Date"], observed=True)[PARTIAL_COLUMNS].sum()
+                .reset_index())
+    return partials
+
+
+def rollup_partials(partials, by, var_):
+    """Merges partials to the `by` columns and returns the weighted mean var_, weight and count."""
+    sums = partials.groupby(by, observed=True)[PARTIAL_COLUMNS].sum().reset_index()
+    sums[var_] = sums["sum"] / sums["weight"]
+    return sums[by + [var_, "weight", "count"]]
+
+
+def manifest_key(name):
+    return f"{PARTIALS_ROOT}/{name}/_manifest.json"
+
+
+def read_manifest(name, bucket):
+    """
+    The manifest of `name`: for each date with partials, the fingerprint of
+    the raw objects they were computed from and their row count. Days with
+    no raw data are recorded with zero rows, so they are not read again.
+    """
+    s3 = s3_io.get_s3_client()
+    try:
+        response = retry.call("s3", s3.get_object, Bucket=bucket, Key=manifest_key(name))
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return {}
+        raise
+    return json.loads(response["Body"].read())
+
+
+def write_manifest(manifest, name, bucket):
+    s3 = s3_io.get_s3_client()
+    retry.call("s3", s3.put_object, Bucket=bucket, Key=manifest_key(name),
+               Body=json.dumps(manifest, indent=1, sort_keys=True).encode(), ContentType="application/json")
+
+
+def source_fingerprints(table_name, dates, bucket):
+    """
+    Fingerprint per date of the raw objects under mark/<table_name>/date=<date>/:
+    a hash of their keys and ETags, or "" when there are none. A rewritten
+    or backfilled day gets a new fingerprint.
+    """
+    def fingerprint(date_):
+        objects = s3_io.s3_list_objects(bucket, f"mark/{table_name}/date={date_}/")
+        if not objects:
+            return ""
+        tags = sorted(f"{obj['Key']}:{obj.get('ETag', '')}" for obj in objects)
+        return hashlib.sha1("\n".join(tags).encode()).hexdigest()
+
+    return dict(zip(dates, s3_io.get_io_pool().map(fingerprint, dates)))
+
+
+def _date_runs(dates):
+    """Groups sorted dates into (first, last) runs of consecutive days."""
+    runs = []
+    for date_ in dates:
+        if runs and date_ - runs[-1][1] == pd.Timedelta(days=1):
+            runs[-1][1] = date_
+        else:
+            runs.append([date_, date_])
+    return runs
+
+
+def write_partials_day(partials, name, date_, bucket):
+    profile = s3_io.get_writer_profile(name)
+    day = s3_io.sort_for_profile(partials.drop(columns=["Date"]), profile)
+    s3_path = f"s3://{bucket}/{PARTIALS_ROOT}/{name}/date={date_}/{name}_{date_}.parquet"
+
+    def write():
+        with s3_io.fs.open(s3_path, "wb") as f:
+            s3_io.write_parquet_table(pa.Table.from_pandas(day, preserve_index=False), f, profile)
+
+    retry.call("s3", write)
+
+
+def delete_partials_day(name, date_, bucket):
+    """Removes the partials of a day whose raw data is gone, so read_partials does not return stale rows."""
+    s3 = s3_io.get_s3_client()
+    retry.call("s3", s3.delete_object, Bucket=bucket, Key=f"{PARTIALS_ROOT}/{name}/date={date_}/{name}_{date_}.parquet")
+
+
+def update_partials(name, table_name, start_date, end_date, keys, var_, wt_=None, bucket=None):
+    """
+    Brings the partials of `name` up to date for start_date..end_date from
+    raw table mark/<table_name>. A day is read from the raw table only when
+    the fingerprint of its raw objects differs from the one its partials
+    were computed from, so new, late and backfilled days are picked up and
+    unchanged days are not. Returns the dates recomputed.
+    """
+    manifest = read_manifest(name, bucket)
+    dates = [date_.strftime("%Y-%m-%d") for date_ in pd.date_range(start_date, end_date)]
+    fingerprints = source_fingerprints(table_name, dates, bucket)
+    stale = [date_ for date_ in dates if manifest.get(date_, {}).get("source") != fingerprints[date_]]
+    if not stale:
+        return []
+
+    columns = keys + [var_] + ([wt_] if wt_ else [])
+    runs = _date_runs([pd.Timestamp(date_) for date_ in stale if fingerprints[date_]])
+    raw = [s3_io.s3_read_parquet_parallel(table_name, first, last, bucket=bucket, columns=columns)
+           for first, last in runs]
+    raw = [df for df in raw if not df.empty]
+    partials = pd.DataFrame(columns=keys + ["Date"] + PARTIAL_COLUMNS)
+    if raw:
+        raw = pd.concat(raw, ignore_index=True)
+        raw["Date"] = pd.to_datetime(raw["Date"]).dt.strftime("%Y-%m-%d")
+        partials = compute_daily_partials(raw, keys, var_, wt_)
+        del raw
+
+    days = partials.groupby("Date").indices
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(stale)))) as executor:
+        list(executor.map(lambda date_: write_partials_day(partials.iloc[days[date_]], name, date_, bucket)
+                          if date_ in days else delete_partials_day(name, date_, bucket), stale))
+
+    for date_ in stale:
+        manifest[date_] = {"source": fingerprints[date_], "rows": int(len(days.get(date_, [])))}
+    write_manifest(manifest, name, bucket)
+    print(f"Updated {len(stale)} days of {PARTIALS_ROOT}/{name} from {table_name} "
+          f"({len(stale) - len(days)} without data)")
+    return stale
+
+
+def read_partials(name, start_date, end_date, bucket, signals_list=None):
+    """Reads the stored partials of `name` for a date range, with a Date column."""
+    df = s3_io.s3_read_parquet_parallel(name, start_date, end_date, signals_list=signals_list, bucket=bucket,
+                                        s3root=PARTIALS_ROOT)
+    if not df.empty:
+        df["Date"] = pd.to_datetime(df["Date"])
+    return df
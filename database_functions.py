@@ -1,7 +1,11 @@
 import pandas as pd
 import boto3
 import pyodbc
-from sqlalchemy import create_engine
+import atexit
+import threading
+from collections import defaultdict
+import retry
+from sqlalchemy import create_engine, text
 from datetime import datetime, timedelta
 import json
 import os
@@ -59,24 +63,146 @@ def get_aurora_connection(load_data_local_infile=False):
         f"mysql+pymysql://{cred['RDS_USERNAME']}:{cred['RDS_PASSWORD']}@{cred['RDS_HOST']}:3306/{cred['RDS_DATABASE']}",
         connect_args={"local_infile": load_data_local_infile},
     )
-    return engine.connect()
+    return retry.call("aurora", engine.connect)
 
 def get_athena_connection(conf_athena):
     engine = create_engine(
         f"awsathena+rest://@athena.{conf_athena['region']}.amazonaws.com:443/{conf_athena['database']}",
         connect_args={"s3_staging_dir": conf_athena["staging_dir"]},
     )
-    return engine.connect()
+    return retry.call("athena", engine.connect)
 
 # Athena partition management
+class AthenaPartitionManager:
+    """
+    Queues date partitions to register per Athena table and adds them with one
+    ALTER TABLE ... ADD IF NOT EXISTS PARTITION statement per batch, over one
+    connection per database kept for the life of the process. A table is
+    flushed when batch_size dates are queued for it, at the end of a stage
+    (flush) and at exit (flush_all); dates whose statement fails stay queued
+    for the next flush. Partitions already registered by this process are
+    skipped, as are tables listed under `partition_projection` in the athena
+    config, which need no registration at all.
+    """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.pending = defaultdict(set)
+        self.registered = defaultdict(set)
+        self.confs = {}
+        self.connections = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        atexit.register(self.flush_all)
+
+    def add(self, conf_athena, table_name, date_):
+        if table_name in conf_athena.get("partition_projection", []):
+            return
+        key = (conf_athena["database"], table_name)
+        date_ = str(date_)
+        with self._lock:
+            self.confs[conf_athena["database"]] = conf_athena
+            if date_ not in self.registered[key]:
+                self.pending[key].add(date_)
+            full = len(self.pending[key]) >= self.batch_size
+        if full:
+            self.flush(conf_athena, table_name)
+
+    def _connection(self, conf_athena):
+        conn = self.connections.get(conf_athena["database"])
+        if conn is None or conn.closed:
+            conn = get_athena_connection(conf_athena)
+            self.connections[conf_athena["database"]] = conn
+        return conn
+
+    def flush(self, conf_athena, table_name=None):
+        # One flush at a time, so the shared connection is never used by two threads
+        with self._flush_lock:
+            with self._lock:
+                keys = [key for key, dates in self.pending.items()
+                        if dates and key[0] == conf_athena["database"] and table_name in (None, key[1])]
+                work = {key: sorted(self.pending.pop(key)) for key in keys}
+            if not work:
+                return
+
+            done = set()
+            try:
+                conn = self._connection(conf_athena)
+                for (database, table), dates in work.items():
+                    for i in range(0, len(dates), self.batch_size):
+                        batch = dates[i:i + self.batch_size]
+                        partitions = " ".join(f"PARTITION (date='{date_}')" for date_ in batch)
+                        retry.call("athena", conn.execute,
+                                   text(f"ALTER TABLE {database}.{table} ADD IF NOT EXISTS {partitions}"))
+                        done.update((database, table, date_) for date_ in batch)
+                        with self._lock:
+                            self.registered[(database, table)].update(batch)
+                        print(f"Successfully created {len(batch)} partitions ({batch[0]} to {batch[-1]}) "
+                              f"for {database}.{table}")
+            except Exception as e:
+                # Put back what was not registered, for the next flush, on a new connection
+                with self._lock:
+                    for (database, table), dates in work.items():
+                        self.pending[(database, table)].update(
+                            date_ for date_ in dates if (database, table, date_) not in done)
+                    queued = {f"{database}.{table}": len(self.pending[(database, table)])
+                              for database, table in work}
+                conn = self.connections.pop(conf_athena["database"], None)
+                if conn is not None:
+                    conn.close()
+                print(f"Error: {str(e)} - Partitions still queued: {queued}")
+
+    def flush_all(self):
+        """Flushes every database with queued partitions and closes the connections."""
+        for conf_athena in list(self.confs.values()):
+            self.flush(conf_athena)
+        for conn in self.connections.values():
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self.connections.clear()
+
+
+partition_manager = AthenaPartitionManager()
+
+
+def add_athena_partitions(conf_athena, table_name, dates):
+    for date_ in dates:
+        partition_manager.add(conf_athena, table_name, date_)
+    partition_manager.flush(conf_athena, table_name)
+
+
 def add_athena_partition(conf_athena, bucket, table_name, date_):
+    """Queues one partition; it is registered with the next flush of its table."""
+    partition_manager.add(conf_athena, table_name, date_)
+
+
+def flush_athena_partitions(conf_athena):
+    """Registers every partition queued for this Athena database, e.g. at the end of a stage."""
+    partition_manager.flush(conf_athena)
+
+
+def enable_partition_projection(conf_athena, bucket, table_name, s3root="mark", range_start="2018-01-01"):
+    """
+    Sets up date partition projection, so Athena derives the partitions of
+    s3://bucket/s3root/table_name/date=YYYY-MM-DD/ without any registration.
+    """
+    properties = {
+        "projection.enabled": "true",
+        "projection.date.type": "date",
+        "projection.date.format": "yyyy-MM-dd",
+        "projection.date.range": f"{range_start},NOW",
+        "projection.date.interval": "1",
+        "projection.date.interval.unit": "DAYS",
+        "storage.location.template": f"s3://{bucket}/{s3root}/{table_name}/date=${{date}}",
+    }
+    tblproperties = ", ".join(f"'{k}'='{v}'" for k, v in properties.items())
+    conn = get_athena_connection(conf_athena)
     try:
-        conn = get_athena_connection(conf_athena)
-        query = f"ALTER TABLE {conf_athena['database']}.{table_name} ADD PARTITION (date='{date_}')"
-        conn.execute(query)
-        print(f"Successfully created partition (date='{date_}') for {conf_athena['database']}.{table_name}")
-    except Exception as e:
-        print(f"Error: {str(e)} - Partition (date='{date_}') for {conf_athena['database']}.{table_name}")
+        retry.call("athena", conn.execute,
+                   text(f"ALTER TABLE {conf_athena['database']}.{table_name} SET TBLPROPERTIES ({tblproperties})"))
+        print(f"Enabled partition projection for {conf_athena['database']}.{table_name}")
     finally:
         conn.close()
 
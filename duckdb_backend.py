@@ -0,0 +1,172 @@
+# duckdb_backend.py
+#
+# Optional out-of-core backend for the weighted rollups in aggregations.py.
+# The aggregation runs as SQL in DuckDB directly over the parquet files of
+# mark/<table>/date=*/, spilling to disk when it does not fit in memory, and
+# only the aggregated result is brought into pandas. Needs the duckdb
+# package; without it AVAILABLE is False and callers keep the pandas path.
+# Enabled from the `duckdb` section of Monthly_Report.yaml, e.g.
+# duckdb:
+#     memory_limit: 4GB
+#     temp_directory: /tmp/duckdb
+#     threads: 4
+
+import threading
+
+import boto3
+import pandas as pd
+
+try:
+    import duckdb
+    AVAILABLE = True
+except ImportError:
+    duckdb = None
+    AVAILABLE = False
+
+from aggregations import add_delta
+from configs import corridor_dimension
+
+# Period columns computed from the date=YYYY-MM-DD partition. Week and Month
+# are the Monday of the week and the first of the month. (DuckDB names are
+# case-insensitive, so these are computed under another alias than `date`.)
+PERIODS = {
+    "Date": "CAST(date AS DATE)",
+    "Week": "CAST(date_trunc('week', CAST(date AS DATE)) AS DATE)",
+    "Month": "CAST(date_trunc('month', CAST(date AS DATE)) AS DATE)",
+}
+
+_connection = None
+_lock = threading.Lock()
+
+
+def enabled(conf):
+    """True if the `duckdb` section is set in conf and duckdb is installed."""
+    if conf.get("duckdb") and not AVAILABLE:
+        print("duckdb is not installed, aggregating in pandas")
+    return bool(conf.get("duckdb")) and AVAILABLE
+
+
+def connect(memory_limit=None, temp_directory=None, threads=None):
+    """
+    Returns the DuckDB connection of this process, created on first use with
+    httpfs and an S3 secret using the AWS credential chain, so temporary
+    credentials are refreshed during long runs.
+    """
+    global _connection
+    with _lock:
+        if _connection is not None:
+            return _connection
+        if not AVAILABLE:
+            raise ImportError("duckdb_backend needs the duckdb package")
+
+        con = duckdb.connect()
+        for extension in ["httpfs", "aws"]:
+            con.execute(f"INSTALL {extension}")
+            con.execute(f"LOAD {extension}")
+        if memory_limit:
+            con.execute(f"SET memory_limit = '{memory_limit}'")
+        if temp_directory:
+            con.execute(f"SET temp_directory = '{temp_directory}'")
+        if threads:
+            con.execute(f"SET threads = {int(threads)}")
+
+        region = boto3.Session().region_name or "us-east-1"
+        con.execute(f"CREATE OR REPLACE SECRET mark_s3 (TYPE s3, PROVIDER credential_chain, REGION '{region}')")
+
+        _connection = con
+        return con
+
+
+def _source(table_name, bucket, s3root="mark"):
+    return (f"read_parquet('s3://{bucket}/{s3root}/{table_name}/date=*/*.parquet', "
+            f"hive_partitioning = true, union_by_name = true)")
+
+
+def _weighted_query(table_name, bucket, by, per_, var_, wt_, join="", signals=False):
+    """
+    SQL for the mean of var_ weighted by wt_ and the total weight, grouped by
+    `by` and the period per_, over start..end dates. The rule is that of
+    aggregations.weighted_mean: a row with a missing var_ adds nothing to the
+    weighted sum but its weight still counts. Without wt_ it is the plain
+    mean over non-missing values, as groupby().mean(), with their count.
+    """
+    columns = ", ".join(by)
+    if wt_:
+        aggregates = (f"COALESCE(SUM(f.{var_} * f.{wt_}), 0) / SUM(f.{wt_}) AS {var_}, "
+                      f"SUM(f.{wt_}) AS {wt_}")
+    else:
+        aggregates = f"AVG(f.{var_}) AS {var_}, COUNT(f.{var_}) AS ones"
+    return f"""
+        SELECT {columns}, f._period AS {per_}, {aggregates}
+        FROM (SELECT *, {PERIODS[per_]} AS _period FROM {_source(table_name, bucket)}) f
+        {join}
+        WHERE CAST(f.date AS DATE) BETWEEN ? AND ?
+          {"AND list_contains(?, CAST(f.SignalID AS VARCHAR))" if signals else ""}
+        GROUP BY {columns}, f._period
+    """
+
+
+def _run(query, start_date, end_date, signals_list=None, conf=None, views=None):
+    """Runs a query on a cursor of its own, with DataFrames in `views` registered by name."""
+    con = connect(**((conf or {}).get("duckdb") or {}))
+    params = [pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()]
+    if signals_list is not None:
+        params.append([str(s) for s in signals_list])
+    with _lock:
+        cursor = con.cursor()
+    for name, frame in (views or {}).items():
+        cursor.register(name, frame)
+    try:
+        return cursor.execute(query, params).df()
+    finally:
+        cursor.close()
+
+
+def period_avg(table_name, var_, per_, start_date, end_date, bucket, wt_=None, signals_list=None, conf=None):
+    """
+    Average of var_ per SignalID and period (Date, Week or Month) read
+    straight from mark/<table_name>. With wt_ it equals
+    aggregations.get_period_avg(df, var_, per_, wt_); without, the plain mean
+    per signal and period. Returns SignalID, per_, var_, the weight column
+    (wt_, or "ones" holding the count of values) and delta.
+    """
+    query = _weighted_query(table_name, bucket, ["f.SignalID"], per_, var_, wt_, signals=signals_list is not None)
+    result = _run(query, start_date, end_date, signals_list, conf)
+    result[per_] = pd.to_datetime(result[per_])
+    result = result.sort_values(["SignalID", per_], ignore_index=True)
+    add_delta(result, var_, ["SignalID"], [per_])
+    return result[["SignalID", per_, var_, wt_ or "ones", "delta"]]
+
+
+def daily_avg(table_name, var_, start_date, end_date, bucket, wt_=None, signals_list=None, conf=None):
+    return period_avg(table_name, var_, "Date", start_date, end_date, bucket, wt_, signals_list, conf)
+
+
+def weekly_avg(table_name, var_, start_date, end_date, bucket, wt_=None, signals_list=None, conf=None):
+    return period_avg(table_name, var_, "Week", start_date, end_date, bucket, wt_, signals_list, conf)
+
+
+def monthly_avg(table_name, var_, start_date, end_date, bucket, wt_=None, signals_list=None, conf=None):
+    return period_avg(table_name, var_, "Month", start_date, end_date, bucket, wt_, signals_list, conf)
+
+
+def corridor_avg(table_name, var_, per_, corridors, start_date, end_date, bucket, wt_=None, conf=None):
+    """
+    Average of var_ per Zone_Group, Zone, Corridor and period read straight
+    from mark/<table_name>; equals aggregations.weighted_mean_by_corridor_
+    with the same wt_. Signals without a corridor are dropped by the join.
+    """
+    dim = corridor_dimension(corridors)
+    columns = ["Zone_Group", "Zone", "Corridor"]
+    dim_frame = dim.corridors[["SignalID"] + columns].dropna(subset=["Corridor"])
+
+    join = "JOIN corridors c ON c.SignalID = TRY_CAST(f.SignalID AS BIGINT)"
+    query = _weighted_query(table_name, bucket, [f"c.{col}" for col in columns], per_, var_, wt_, join)
+    result = _run(query, start_date, end_date, conf=conf, views={"corridors": dim_frame})
+
+    result[per_] = pd.to_datetime(result[per_])
+    for col in columns:
+        result[col] = pd.Categorical(result[col])
+    result = result.sort_values(columns + [per_], ignore_index=True)
+    add_delta(result, var_, columns, [per_])
+    return result[columns + [per_, var_] + ([wt_] if wt_ else []) + ["delta"]]
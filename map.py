@@ -5,6 +5,7 @@ import pandas as pd
 import geopandas as gpd
 from io import StringIO
 from shapely.geometry import LineString
+import artifact_store
 
 def points_to_line(data, long, lat, id_field=None, sort_field=None):
     if sort_field:
@@ -93,7 +94,7 @@ def get_map_data(conf):
                "#ff7f00", "#ffff33", "#a65628", "#f781bf"]
 
     # Load corridors
-    corridors_df = pd.read_feather(f"s3://{conf['bucket']}/all_Corridors_Latest.feather")
+    corridors_df = artifact_store.get_artifact(conf['bucket'], "all_Corridors_Latest.feather")
     corridors_df["Corridor"].fillna("None", inplace=True)
 
     rtop_corridors = corridors_df[corridors_df["Zone"].str.startswith("Zone", na=False)][["Corridor"]].drop_duplicates()
@@ -0,0 +1,186 @@
+# memory_profile.py
+
+import os
+import gc
+import sys
+import json
+import time
+import atexit
+import datetime
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import psutil
+import pandas as pd
+import pyarrow as pa
+
+MB = 1024 ** 2
+
+_enabled = False
+_settings = {}
+_stages = []
+_open = []
+_lock = threading.Lock()
+_sampler = None
+
+
+def tree_rss(process=None):
+    """
+    RSS in bytes of this process and all its child processes, e.g. the
+    workers of a process pool. Pages a forked child still shares with its
+    parent count in both.
+    """
+    process = process or psutil.Process()
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            # The child exited since it was listed
+            continue
+    return rss
+
+
+class _RssSampler(threading.Thread):
+    """Samples the RSS of the process and its children and raises the peak of every open stage."""
+
+    def __init__(self, interval):
+        super().__init__(name="memory_profile_sampler", daemon=True)
+        self.interval = interval
+        self.process = psutil.Process()
+
+    def run(self):
+        while True:
+            rss = tree_rss(self.process)
+            with _lock:
+                for record in _open:
+                    record["peak_rss_mb"] = max(record["peak_rss_mb"], rss / MB)
+            time.sleep(self.interval)
+
+
+def enable(report_dir=".", use_tracemalloc=True, tracemalloc_frames=5, top_allocators=10, interval=0.1):
+    """
+    Turns on stage profiling for this process. The JSON report is written to
+    report_dir at exit. Set from the `memory_profile` section of
+    Monthly_Report.yaml, e.g.
+    memory_profile:
+        report_dir: logs
+        use_tracemalloc: false
+    """
+    global _enabled, _sampler
+    if _enabled:
+        return
+    _enabled = True
+    _settings.update(report_dir=report_dir, use_tracemalloc=use_tracemalloc, top_allocators=top_allocators,
+                     script=os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0],
+                     started=datetime.datetime.now())
+    if use_tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start(tracemalloc_frames)
+    _sampler = _RssSampler(interval)
+    _sampler.start()
+    atexit.register(write_report)
+
+
+def is_enabled():
+    return _enabled
+
+
+def _fold_tracemalloc_peak():
+    peak = tracemalloc.get_traced_memory()[1] / MB
+    for record in _open:
+        record["tracemalloc_peak_mb"] = max(record.get("tracemalloc_peak_mb", 0.0), peak)
+
+
+@contextmanager
+def stage(name):
+    """
+    Records peak and end RSS (of the process and its children), duration,
+    tracemalloc peak and top allocators, and the frames passed to track(),
+    for the enclosed block. Stages nest;
+    the recorded name is the path of the enclosing stages. A no-op unless
+    enable() was called.
+    """
+    if not _enabled:
+        yield
+        return
+
+    rss = tree_rss() / MB
+    tracing = tracemalloc.is_tracing()
+    with _lock:
+        if tracing:
+            # Keep the enclosing stages' peak before it is reset for this one
+            _fold_tracemalloc_peak()
+            tracemalloc.reset_peak()
+        path = "/".join([record["stage"] for record in _open[-1:]] + [name])
+        record = {"stage": path, "start_rss_mb": rss, "peak_rss_mb": rss, "frames": []}
+        if tracing:
+            record["tracemalloc_peak_mb"] = 0.0
+        _open.append(record)
+    start = time.time()
+    if tracing:
+        before = tracemalloc.take_snapshot()
+    try:
+        yield
+    finally:
+        record["seconds"] = round(time.time() - start, 2)
+        record["end_rss_mb"] = tree_rss() / MB
+        if tracing:
+            with _lock:
+                _fold_tracemalloc_peak()
+            stats = tracemalloc.take_snapshot().compare_to(before, "lineno")[:_settings["top_allocators"]]
+            record["top_allocators"] = [
+                {"where": str(stat.traceback[0]), "size_diff_mb": stat.size_diff / MB, "count_diff": stat.count_diff}
+                for stat in stats
+            ]
+        with _lock:
+            record["peak_rss_mb"] = max(record["peak_rss_mb"], record["end_rss_mb"])
+            _open.remove(record)
+            _stages.append(record)
+
+
+def frame_size(df):
+    """In-memory size in bytes of a DataFrame (including object contents) or an Arrow table."""
+    if isinstance(df, (pa.Table, pa.RecordBatch)):
+        return df.nbytes
+    return int(df.memory_usage(deep=True).sum())
+
+
+def track(name, df):
+    """Records the size of a named frame in the innermost open stage. Returns df."""
+    if _enabled and df is not None:
+        entry = {"name": name, "rows": len(df), "mb": frame_size(df) / MB}
+        with _lock:
+            if _open:
+                _open[-1]["frames"].append(entry)
+    return df
+
+
+def largest_frames(n=20):
+    """The n largest DataFrames and Arrow tables alive in the process, as (description, MB)."""
+    frames = [obj for obj in gc.get_objects() if isinstance(obj, (pd.DataFrame, pa.Table))]
+    sizes = sorted(((f"{type(obj).__name__} {obj.shape}", frame_size(obj) / MB) for obj in frames),
+                   key=lambda x: x[1], reverse=True)
+    return sizes[:n]
+
+
+def write_report(path=None):
+    """Writes the recorded stages, sorted by when they finished, to a JSON file."""
+    if not _enabled:
+        return None
+    if path is None:
+        path = os.path.join(_settings["report_dir"],
+                            f"memory_profile_{_settings['script']}_{_settings['started']:%Y%m%d_%H%M%S}.json")
+    with _lock:
+        stages = list(_stages)
+    report = {
+        "script": _settings["script"],
+        "started": _settings["started"].isoformat(timespec="seconds"),
+        "max_rss_mb": max([record["peak_rss_mb"] for record in stages], default=None),
+        "stages": stages,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Memory profile written to {path}")
+    return path
@@ -0,0 +1,103 @@
+# pipeline.py
+
+import queue
+import threading
+import traceback
+from datetime import datetime
+
+_DONE = object()
+
+
+class PipelineError(RuntimeError):
+    """Raised by run_pipeline after all items ran if any stage failed. `failures` is a list of (stage, item, exception)."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        summary = ", ".join(f"{stage} {item}" for stage, item, _ in failures[:10])
+        super().__init__(f"{len(failures)} pipeline stage(s) failed: {summary}")
+
+
+def run_pipeline(items, read, compute=None, write=None, queue_size=2):
+    """
+    Runs read -> compute -> write over items (typically dates) with the stages
+    overlapping, so day N+1 downloads while day N is computed and day N-1
+    uploads.
+
+    read(item) runs in a reader thread, compute(item, data) in the calling
+    thread and write(item, result) in a writer thread. Bounded queues of
+    `queue_size` between the stages cap how many days are held in memory.
+    A compute result of None skips the write for that item. An exception in
+    any stage is logged and that item skipped so the other items still run;
+    once the queues are drained a PipelineError listing the failures is
+    raised, so a missing day fails the job as the per-date loops did.
+    """
+    read_q = queue.Queue(maxsize=queue_size)
+    write_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    failures = []
+    failures_lock = threading.Lock()
+
+    def failed(stage, item, e):
+        print(f"{datetime.now()} [pipeline] {stage} failed for {item}: {e}")
+        traceback.print_exc()
+        with failures_lock:
+            failures.append((stage, item, e))
+
+    def reader():
+        try:
+            for item in items:
+                if stop.is_set():
+                    break
+                try:
+                    data = read(item)
+                except Exception as e:
+                    failed("read", item, e)
+                    continue
+                read_q.put((item, data))
+        finally:
+            read_q.put(_DONE)
+
+    def writer():
+        while True:
+            entry = write_q.get()
+            if entry is _DONE:
+                break
+            item, result = entry
+            try:
+                write(item, result)
+            except Exception as e:
+                failed("write", item, e)
+
+    reader_thread = threading.Thread(target=reader, name="pipeline_read", daemon=True)
+    writer_thread = threading.Thread(target=writer, name="pipeline_write", daemon=True)
+    reader_thread.start()
+    writer_thread.start()
+
+    try:
+        while True:
+            entry = read_q.get()
+            if entry is _DONE:
+                break
+            item, data = entry
+            try:
+                result = compute(item, data) if compute is not None else data
+            except Exception as e:
+                failed("compute", item, e)
+                continue
+            del data
+            if result is not None and write is not None:
+                write_q.put((item, result))
+            del result
+    finally:
+        # Unblock the reader if we are leaving early, then let the writer drain
+        stop.set()
+        while reader_thread.is_alive():
+            try:
+                read_q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        write_q.put(_DONE)
+        writer_thread.join()
+
+    if failures:
+        raise PipelineError(failures)
@@ -0,0 +1,228 @@
+# retry.py
+
+import time
+import random
+import threading
+from collections import defaultdict
+from botocore.exceptions import (
+    ClientError, EndpointConnectionError, ConnectionClosedError, ReadTimeoutError, ConnectTimeoutError
+)
+
+THROTTLE = "throttle"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+THROTTLING_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottled", "RequestThrottledException",
+    "SlowDown", "RequestLimitExceeded", "TooManyRequestsException", "ProvisionedThroughputExceededException",
+}
+TRANSIENT_CODES = {
+    "InternalError", "InternalFailure", "InternalServerException", "ServiceUnavailable", "RequestTimeout",
+    "RequestTimeoutException",
+}
+THROTTLING_MESSAGES = ("throttl", "slow down", "rate exceeded", "too many requests")
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a service whose circuit breaker is open.
+    `retry_after` is the number of seconds until a trial call is let through.
+    """
+
+    def __init__(self, message, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def classify(exc):
+    """
+    Classifies an exception as THROTTLE, TRANSIENT (worth retrying) or
+    PERMANENT. An open circuit is THROTTLE: the retry loop waits for the
+    breaker's reset before trying again.
+    """
+    if isinstance(exc, CircuitOpenError):
+        return THROTTLE
+    if isinstance(exc, ClientError):
+        error = exc.response.get("Error", {})
+        code = error.get("Code", "")
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        if code in THROTTLING_CODES or status in (429, 503):
+            return THROTTLE
+        if code in TRANSIENT_CODES or status >= 500:
+            return TRANSIENT
+        return PERMANENT
+    if isinstance(exc, (EndpointConnectionError, ConnectionClosedError, ReadTimeoutError, ConnectTimeoutError,
+                        TimeoutError, ConnectionError)):
+        return TRANSIENT
+    if isinstance(exc, (FileNotFoundError, PermissionError, KeyError, ValueError, TypeError, AttributeError)):
+        return PERMANENT
+    # Driver errors (PyAthena, pymysql via SQLAlchemy) only say "throttled" in the message
+    if any(message in str(exc).lower() for message in THROTTLING_MESSAGES):
+        return THROTTLE
+    return TRANSIENT
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive throttled or transient
+    failures of a service. Permanent errors (missing keys, failed
+    preconditions) are answers from a healthy service and do not count.
+    While open, calls fail fast with CircuitOpenError instead of adding load,
+    and the retry loop waits until the breaker resets. After `reset_timeout`
+    seconds one trial call is let through (half-open).
+    """
+
+    def __init__(self, name, failure_threshold=10, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            retry_after = self.opened_at + self.reset_timeout - time.monotonic()
+            if retry_after > 0 or self.trial_running:
+                raise CircuitOpenError(f"Circuit for {self.name} is open", max(0.0, retry_after))
+            self.trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"[retry] Circuit for {self.name} opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+
+class RetryStats:
+    """Thread-safe counters of calls, attempts and backoff per service."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(lambda: defaultdict(float))
+
+    def add(self, service, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[service][name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {service: dict(counts) for service, counts in self.counters.items()}
+
+
+class RetryPolicy:
+    """
+    Retries a call on throttling and transient errors with full-jitter
+    exponential backoff, so parallel callers do not retry in lockstep.
+    Permanent errors are raised at once. Throttling backs off
+    `throttle_multiplier` times longer than other transient errors.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30, throttle_multiplier=4, timeout=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttle_multiplier = throttle_multiplier
+        self.timeout = timeout
+
+    def backoff(self, attempt, kind):
+        cap = self.base_delay * 2 ** (attempt - 1)
+        if kind == THROTTLE:
+            cap *= self.throttle_multiplier
+        return random.uniform(0, min(self.max_delay, cap))
+
+    def call(self, func, *args, service="default", **kwargs):
+        breaker = get_breaker(service)
+        for attempt in range(1, self.max_attempts + 1):
+            stats.add(service, attempts=1)
+            try:
+                breaker.before_call()
+                try:
+                    result = _call_with_timeout(func, self.timeout, *args, **kwargs)
+                except Exception as e:
+                    if classify(e) == PERMANENT:
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+                    raise
+                breaker.record_success()
+                stats.add(service, successes=1)
+                return result
+            except Exception as e:
+                kind = classify(e)
+                stats.add(service, **{kind: 1})
+                if kind == PERMANENT or attempt == self.max_attempts:
+                    stats.add(service, failures=1)
+                    raise
+                delay = self.backoff(attempt, kind)
+                if isinstance(e, CircuitOpenError):
+                    # Wait for the trial call, jittered so waiting threads do not all arrive at once
+                    delay = min(max(delay, e.retry_after), breaker.reset_timeout) + random.uniform(0, self.base_delay)
+                stats.add(service, backoff_seconds=delay)
+                print(f"[retry] {service} attempt {attempt} failed ({kind}): {str(e).strip()[:200]}. "
+                      f"Retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+
+POLICIES = {
+    "default": RetryPolicy(),
+    "s3": RetryPolicy(max_attempts=6, base_delay=0.25, max_delay=20),
+    "athena": RetryPolicy(max_attempts=5, base_delay=1, max_delay=60),
+    "aurora": RetryPolicy(max_attempts=4, base_delay=1, max_delay=30),
+}
+
+stats = RetryStats()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(service):
+    with _breakers_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker(service)
+        return _breakers[service]
+
+
+def _call_with_timeout(func, timeout, *args, **kwargs):
+    """
+    Runs func with a timeout on a daemon thread of its own, so a call that
+    hangs past its timeout holds no slot that later calls wait for.
+    The hung call itself cannot be stopped and is left to finish.
+    """
+    if timeout is None:
+        return func(*args, **kwargs)
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = func(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, name=f"retry_timeout_{getattr(func, '__name__', 'call')}", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"{getattr(func, '__name__', 'call')} did not finish within {timeout}s")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def call(service, func, *args, **kwargs):
+    """Calls func(*args, **kwargs) under the retry policy and circuit breaker of a service."""
+    policy = POLICIES.get(service, POLICIES["default"])
+    return policy.call(func, *args, service=service, **kwargs)
@@ -0,0 +1,138 @@
+# s3_cache.py
+
+import os
+import uuid
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+
+class S3ObjectCache:
+    """
+    Size-bounded LRU cache of S3 objects on local disk.
+
+    Files are keyed by bucket, key and ETag, so a changed object gets a new
+    cache entry and the stale one ages out. Freshness is checked with the
+    ETag from a listing when the caller has one, otherwise with a HEAD request.
+    Recency is tracked through file mtimes so it survives between runs.
+    Files being read through pinned() are not evicted until the read ends.
+    The directory is scanned once, when the cache is created; after that the
+    files in LRU order and their total size are kept up to date on every
+    insert and eviction.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pins = {}
+        self._lock = threading.Lock()
+
+        # path -> size, least recently used first
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+        files = [(entry.stat().st_mtime, entry.path, entry.stat().st_size)
+                 for entry in os.scandir(self.cache_dir)
+                 if entry.is_file() and not entry.name.endswith(".tmp")]
+        for _, path, size in sorted(files):
+            self._add(path, size)
+
+    def _add(self, path, size):
+        self.total_bytes += size - self._entries.pop(path, 0)
+        self._entries[path] = size
+
+    def _remove(self, path):
+        self.total_bytes -= self._entries.pop(path, 0)
+
+    def path_for(self, bucket, key, etag):
+        digest = hashlib.sha1(f"{bucket}/{key}/{etag.strip(chr(34))}".encode()).hexdigest()
+        return self.cache_dir / f"{digest}{Path(key).suffix}"
+
+    def fetch(self, bucket, key, etag=None, s3=None, pin=False):
+        """
+        Returns a local path holding the current version of s3://bucket/key.
+        With pin=True the file is also pinned against eviction; see pinned().
+        """
+        s3 = s3 or boto3.client("s3")
+        if etag is None:
+            etag = s3.head_object(Bucket=bucket, Key=key)["ETag"]
+
+        path = self.path_for(bucket, key, etag)
+        # The hit check and the pin happen under the lock evict() holds, so
+        # a hit cannot be deleted before the caller opens it
+        with self._lock:
+            if path.exists():
+                os.utime(path)
+                self.hits += 1
+                if str(path) in self._entries:
+                    self._entries.move_to_end(str(path))
+                else:
+                    # Written by another process sharing the directory
+                    self._add(str(path), path.stat().st_size)
+                if pin:
+                    self._pin(str(path))
+                return str(path)
+            self.misses += 1
+
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            s3.download_file(Bucket=bucket, Key=key, Filename=str(tmp))
+            with self._lock:
+                size = tmp.stat().st_size
+                os.replace(tmp, path)
+                self._add(str(path), size)
+                if pin:
+                    self._pin(str(path))
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        self.evict(keep=str(path))
+        return str(path)
+
+    def _pin(self, path):
+        self._pins[path] = self._pins.get(path, 0) + 1
+
+    def _unpin(self, path):
+        with self._lock:
+            self._pins[path] -= 1
+            if not self._pins[path]:
+                del self._pins[path]
+
+    @contextmanager
+    def pinned(self, bucket, key, etag=None, s3=None):
+        """Like fetch(), as a context manager that keeps the file from being evicted while in use."""
+        path = self.fetch(bucket, key, etag, s3, pin=True)
+        try:
+            yield path
+        finally:
+            self._unpin(path)
+
+    def evict(self, keep=None):
+        """
+        Deletes least recently used files until the cache fits in max_bytes.
+        `keep` and pinned files are never deleted, so a file just fetched
+        or being read is always there.
+        """
+        with self._lock:
+            if self.total_bytes > self.max_bytes:
+                for path in list(self._entries):
+                    if self.total_bytes <= self.max_bytes:
+                        break
+                    if path == keep or path in self._pins:
+                        continue
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    self._remove(path)
+            logger.debug(f"S3 cache at {self.total_bytes / 1024 ** 3:.2f} GB "
+                         f"({self.hits} hits, {self.misses} misses)")
@@ -3,113 +3,548 @@
 import os
 import re
 import time
+import logging
+import threading
 import boto3
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import pandas as pd
 import s3fs
-from concurrent.futures import ProcessPoolExecutor
-import database_functions as dbf
+from concurrent.futures import ThreadPoolExecutor
+import watermarks
+import retry
+from s3_cache import S3ObjectCache
 
 fs = s3fs.S3FileSystem()
+logger = logging.getLogger(__name__)
 
-def s3_upload_parquet(df, date_, fn, bucket, table_name, conf_athena):
-    df = df.copy()
+# Number of concurrent S3 requests used by the multi-day readers. Reads are
+# network bound, so this is deliberately larger than the number of cores.
+S3_IO_WORKERS = 32
+
+# Multipart upload part size for streamed parquet writes
+S3_PART_SIZE = 16 * 1024 ** 2
+
+_s3_client = None
+_io_pool = None
+_io_lock = threading.Lock()
+_cache = None
+
+# Parquet writer settings. Rows are sorted so row-group statistics can skip
+# data when filtering by SignalID. Per-table overrides come from the
+# parquet_writer_profiles section of Monthly_Report.yaml, e.g.
+# parquet_writer_profiles:
+#     default:
+#         compression_level: 6
+#     counts_15min:
+#         row_group_size: 262144
+#         sort_by: [SignalID, Detector, Timeperiod]
+DEFAULT_WRITER_PROFILE = {
+    "compression": "zstd",
+    "compression_level": 3,
+    "row_group_size": 128 * 1024,
+    "sort_by": ["SignalID", "Timeperiod"],
+    "use_dictionary": ["SignalID", "Detector", "CallPhase"],
+    "write_statistics": True,
+    "write_page_index": True,
+}
+_writer_profiles = {}
+
+
+def get_s3_client():
+    """Returns a boto3 S3 client shared by all threads of this process."""
+    global _s3_client
+    with _io_lock:
+        if _s3_client is None:
+            _s3_client = boto3.client("s3")
+        return _s3_client
+
+
+def get_io_pool():
+    """Returns the thread pool shared by the S3 readers."""
+    global _io_pool
+    with _io_lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=S3_IO_WORKERS, thread_name_prefix="s3_io")
+        return _io_pool
+
+
+def configure_cache(cache_dir, max_gb=50):
+    """
+    Enables the local disk cache for s3_read_parquet and s3_read_parquet_parallel.
+    Set from the `parquet_cache` section of Monthly_Report.yaml.
+    """
+    global _cache
+    _cache = S3ObjectCache(cache_dir, max_bytes=int(max_gb * 1024 ** 3))
+    return _cache
+
+
+def configure_writer_profiles(profiles):
+    """Sets per-table writer profile overrides, keyed by table name or "default"."""
+    global _writer_profiles
+    _writer_profiles = dict(profiles or {})
+
+
+def get_writer_profile(table_name):
+    profile = dict(DEFAULT_WRITER_PROFILE)
+    for overrides in [_writer_profiles.get("default", {}), _writer_profiles.get(table_name, {})]:
+        # A level belongs to its codec; changing the codec alone drops the inherited level
+        if "compression" in overrides and "compression_level" not in overrides:
+            profile["compression_level"] = None
+        profile.update(overrides)
+    return profile
+
+
+def sort_for_profile(df, profile):
+    """Sorts a frame by the profile's sort columns that it has."""
+    sort_by = [col for col in profile["sort_by"] if col in df.columns]
+    return df.sort_values(sort_by, kind="stable", ignore_index=True) if sort_by else df
+
+
+def _writer_kwargs(profile, column_names):
+    use_dictionary = profile["use_dictionary"]
+    if isinstance(use_dictionary, (list, tuple)):
+        use_dictionary = [col for col in use_dictionary if col in column_names]
+    kwargs = dict(
+        compression=profile["compression"],
+        use_dictionary=use_dictionary,
+        write_statistics=profile["write_statistics"],
+        write_page_index=profile["write_page_index"],
+        use_deprecated_int96_timestamps=True,
+    )
+    # Codecs like snappy reject any compression_level
+    codec = str(profile["compression"] or "none").lower()
+    if (profile.get("compression_level") is not None and codec not in ("none", "uncompressed")
+            and pa.Codec.supports_compression_level(codec)):
+        kwargs["compression_level"] = profile["compression_level"]
+    return kwargs
+
+
+def write_parquet_table(table, where, profile):
+    """Writes a pyarrow Table to a path or open file with a writer profile."""
+    pq.write_table(table, where, row_group_size=profile["row_group_size"],
+                   **_writer_kwargs(profile, table.column_names))
+
+
+def _prepare_frame(df, profile):
+    """Drops the Date partition column, stores IDs as strings and sorts per the profile."""
     df = df.drop(columns=["Date"], errors="ignore")
+    ids = {col: str for col in ["Detector", "CallPhase", "SignalID"] if col in df.columns}
+    if ids:
+        df = df.astype(ids)
+    return sort_for_profile(df, profile)
+
 
-    for col in ["Detector", "CallPhase", "SignalID"]:
-        if col in df.columns:
-            df[col] = df[col].astype(str)
+def _write_parquet_stream(s3_path, chunks, profile, schema=None):
+    """
+    Writes DataFrame chunks, Tables or RecordBatches to one parquet object.
 
+    Chunks are buffered only until a row group fills, then that row group is
+    encoded and written; s3fs sends a multipart-upload part whenever its
+    buffer reaches S3_PART_SIZE. Peak memory is about one row group plus one
+    chunk. On error the multipart upload is aborted, so no partial object is
+    left behind.
+    """
+    row_group_size = profile["row_group_size"]
+    writer = None
+    buffered, buffered_rows = [], 0
+
+    def write_row_groups(final=False):
+        nonlocal buffered, buffered_rows
+        table = pa.concat_tables(buffered)
+        n_full = table.num_rows if final else table.num_rows - table.num_rows % row_group_size
+        if n_full:
+            writer.write_table(table.slice(0, n_full), row_group_size=row_group_size)
+        buffered = [table.slice(n_full)] if n_full < table.num_rows else []
+        buffered_rows = table.num_rows - n_full
+
+    f = fs.open(s3_path, 'wb', block_size=S3_PART_SIZE)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, pd.DataFrame):
+                chunk = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            elif isinstance(chunk, pa.RecordBatch):
+                chunk = pa.Table.from_batches([chunk])
+            if writer is None:
+                schema = schema or chunk.schema
+                writer = pq.ParquetWriter(f, schema, **_writer_kwargs(profile, schema.names))
+            buffered.append(chunk.cast(schema) if chunk.schema != schema else chunk)
+            buffered_rows += chunk.num_rows
+            if buffered_rows >= row_group_size:
+                write_row_groups()
+        if writer is None:
+            raise ValueError(f"No data or schema to write to {s3_path}")
+        if buffered:
+            write_row_groups(final=True)
+        writer.close()
+    except BaseException:
+        f.discard()
+        raise
+    f.close()
+
+
+def s3_upload_parquet_stream(chunks, date_, fn, bucket, table_name, conf_athena, schema=None,
+                             register_partition=True, update_watermark=True):
+    """
+    Streams chunks to mark/<table_name>/date=<date_>/<fn>.parquet without
+    materializing the whole table. Chunks may be DataFrames, pyarrow Tables or
+    RecordBatches, e.g. per-signal frames from utilities.get_signals_chunks:
+
+        chunks = lambda: (df[df.SignalID.isin(signals)] for signals in utils.get_signals_chunks(df))
+
+    DataFrame chunks are prepared like s3_upload_parquet, sorted within each
+    chunk. When chunks is a function returning a new iterable, the write is
+    retried like s3_upload_parquet, calling it again for each attempt; a plain
+    iterable is consumed once and not retried. A failed write raises. See
+    s3_upload_parquet for the remaining arguments.
+    """
+    profile = get_writer_profile(table_name)
     s3_path = f"s3://{bucket}/mark/{table_name}/date={date_}/{fn}.parquet"
 
+    def write(chunks):
+        chunks = (_prepare_frame(chunk, profile) if isinstance(chunk, pd.DataFrame) else chunk for chunk in chunks)
+        _write_parquet_stream(s3_path, chunks, profile, schema)
+
+    if callable(chunks):
+        retry.call("s3", lambda: write(chunks()))
+    else:
+        write(chunks)
+
+    if register_partition:
+        # Local import to avoid circular dependency
+        import database_functions as dbf
+        dbf.add_athena_partition(conf_athena, bucket, table_name, date_)
+    if update_watermark:
+        watermarks.advance_watermark(bucket, f"mark/{table_name}", date_)
+
+
+def s3_list_objects(bucket, prefix, s3=None):
+    """Lists every object under a prefix, following continuation tokens past 1000 keys."""
+    s3 = s3 or get_s3_client()
+    paginator = s3.get_paginator("list_objects_v2")
+
+    def list_all():
+        objects = []
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            objects.extend(page.get("Contents", []))
+        return objects
+
+    return retry.call("s3", list_all)
+
+
+def s3_upload_parquet(df, date_, fn, bucket, table_name, conf_athena, register_partition=True,
+                      update_watermark=True):
+    """
+    Uploads a frame to mark/<table_name>/date=<date_>/<fn>.parquet, queues
+    the Athena partition (registered by the next flush of
+    dbf.partition_manager) and advances the table's watermark. Callers that do
+    both in a batch pass register_partition=False and update_watermark=False.
+    Returns True if the upload succeeded.
+    """
+    profile = get_writer_profile(table_name)
+    df = _prepare_frame(df, profile)
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+
+    s3_path = f"s3://{bucket}/mark/{table_name}/date={date_}/{fn}.parquet"
+
+    # Convert and upload one row group at a time rather than building the
+    # whole Arrow table and encoded file in memory next to the frame.
+    n = profile["row_group_size"]
+
     def write():
-        table = pa.Table.from_pandas(df, preserve_index=False)
-        with fs.open(s3_path, 'wb') as f:
-            pq.write_table(table, f, use_deprecated_int96_timestamps=True)
+        slices = (df.iloc[i:i + n] for i in range(0, max(len(df), 1), n))
+        _write_parquet_stream(s3_path, slices, profile, schema)
+        return True
 
-    # Local import to avoid circular dependency
-    import utilities as utils
-    utils.keep_trying(write, n_tries=5)
+    try:
+        uploaded = retry.call("s3", write)
+    except Exception as e:
+        print(f"Failed to upload {s3_path}: {e}")
+        uploaded = False
 
-    dbf.add_athena_partition(conf_athena, bucket, table_name, date_)
+    if register_partition:
+        # Local import to avoid circular dependency
+        import database_functions as dbf
+        dbf.add_athena_partition(conf_athena, bucket, table_name, date_)
+    if uploaded and update_watermark:
+        watermarks.advance_watermark(bucket, f"mark/{table_name}", date_)
+    return uploaded
 
 
-def s3_upload_parquet_date_split(df, prefix, bucket, table_name, conf_athena, parallel=False, usable_cores=4):
-    df = df.copy()
+def s3_upload_parquet_date_split(df, prefix, bucket, table_name, conf_athena, parallel=True, usable_cores=4):
+    """
+    Uploads one parquet file per date to mark/<table_name>/date=<date>/.
 
-    if "Date" not in df.columns:
-        if "Timeperiod" in df.columns:
-            df["Date"] = pd.to_datetime(df["Timeperiod"]).dt.date
-        elif "Hour" in df.columns:
-            df["Date"] = pd.to_datetime(df["Hour"]).dt.date
+    Rows are partitioned by date in a single groupby pass over the frame and
+    the partitions are uploaded concurrently from up to `usable_cores`
+    threads, or one after the other with parallel=False. The Athena
+    partitions are then registered in one batch and the table's watermark is
+    advanced once, to the last date uploaded. Raises if any date failed to
+    upload, after the other dates are registered.
+    """
+    if "Date" in df.columns:
+        dates = df["Date"]
+    elif "Timeperiod" in df.columns:
+        dates = pd.to_datetime(df["Timeperiod"]).dt.date
+    elif "Hour" in df.columns:
+        dates = pd.to_datetime(df["Hour"]).dt.date
+    else:
+        raise ValueError(f"No Date, Timeperiod or Hour column to split {table_name} by date")
 
-    unique_dates = df["Date"].unique()
+    # Row positions of each date, from one factorize/sort of the date column
+    partitions = list(df.groupby(dates, sort=True).indices.items())
 
-    def process_date(date_):
-        date_str = str(date_)
-        sub_df = df[df["Date"] == date_]
+    def process_date(partition):
+        date_, positions = partition
+        date_str = str(pd.Timestamp(date_).date())
         fn = f"{prefix}_{date_str}"
-        s3_upload_parquet(sub_df, date_str, fn, bucket, table_name, conf_athena)
-        time.sleep(1)
+        uploaded = s3_upload_parquet(df.iloc[positions], date_str, fn, bucket, table_name, conf_athena,
+                                     register_partition=False, update_watermark=False)
+        return date_str, uploaded
 
-    if len(unique_dates) == 1:
-        process_date(unique_dates[0])
+    if parallel and len(partitions) > 1:
+        with ThreadPoolExecutor(max_workers=max(1, min(usable_cores, len(partitions)))) as executor:
+            results = list(executor.map(process_date, partitions))
     else:
-        if parallel and os.name != 'nt':  # not Windows
-            with ProcessPoolExecutor(max_workers=usable_cores) as executor:
-                executor.map(process_date, unique_dates)
+        results = [process_date(partition) for partition in partitions]
+
+    # Local import to avoid circular dependency
+    import database_functions as dbf
+    dbf.add_athena_partitions(conf_athena, table_name, [date_str for date_str, _ in results])
+    # The watermark never moves past a date that failed to upload
+    failed_dates = [date_str for date_str, uploaded in results if not uploaded]
+    uploaded_dates = [date_str for date_str, uploaded in results
+                      if uploaded and (not failed_dates or date_str < min(failed_dates))]
+    if uploaded_dates:
+        watermarks.advance_watermark(bucket, f"mark/{table_name}", max(uploaded_dates))
+    if failed_dates:
+        raise RuntimeError(f"Failed to upload {table_name} for {', '.join(failed_dates)}")
+
+
+def _signals_expression(schema, signals_list):
+    """Builds a SignalID filter with values matching the type stored in the file."""
+    field_type = schema.field("SignalID").type
+    if pa.types.is_dictionary(field_type):
+        field_type = field_type.value_type
+    if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+        values = [str(int(s)) if isinstance(s, float) else str(s) for s in signals_list]
+    else:
+        values = [int(s) for s in signals_list]
+    return pc.field("SignalID").isin(values)
+
+
+def _read_filter(schema, filters=None, signals_list=None):
+    """
+    Combines user filters (DNF list or pyarrow Expression) with a SignalID filter.
+    The result is pushed down to row-group statistics and pages by pyarrow.
+    """
+    expr = None
+    if filters is not None:
+        expr = filters if isinstance(filters, pc.Expression) else pq.filters_to_expression(filters)
+    if signals_list is not None and "SignalID" in schema.names:
+        signals_expr = _signals_expression(schema, signals_list)
+        expr = signals_expr if expr is None else expr & signals_expr
+    return expr
+
+
+def _read_parquet_source(source, columns=None, filters=None, signals_list=None):
+    """Reads a local path or open file with column projection and pushdown filters."""
+    schema = pq.read_schema(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    read_columns = None if columns is None else [col for col in columns if col in schema.names]
+    return pq.read_table(
+        source,
+        columns=read_columns,
+        filters=_read_filter(schema, filters, signals_list),
+    )
+
+
+# Columns returned dictionary-encoded by the Arrow read path
+ARROW_DICTIONARY_COLUMNS = ["SignalID", "Detector", "CallPhase"]
+
+
+def _normalize_arrow_table(table, date_=None):
+    """
+    Arrow equivalent of convert_to_utc plus the Date column added by s3_read_parquet.
+    Timestamps are cast to UTC, ID columns are dictionary-encoded and
+    pandas metadata columns ("__index_level_0__", ...) are dropped.
+    """
+    table = table.drop_columns([name for name in table.column_names if name.startswith("__")])
+    table = table.replace_schema_metadata(None)
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if pa.types.is_timestamp(field.type) and field.type.tz != "UTC":
+            # Naive timestamps are taken as UTC, as in tz_localize("UTC")
+            column = column.cast(pa.timestamp(field.type.unit, tz="UTC"))
+        elif field.name in ARROW_DICTIONARY_COLUMNS and not pa.types.is_dictionary(field.type):
+            column = pc.dictionary_encode(column)
         else:
-            for d in unique_dates:
-                process_date(d)
+            continue
+        table = table.set_column(i, field.name, column)
+    if date_:
+        date_value = pa.scalar(pd.to_datetime(date_).date(), type=pa.date32())
+        table = table.append_column("Date", pa.repeat(date_value, table.num_rows))
+    return table
+
+
+def s3_read_parquet_table(bucket, object_key, columns=None, filters=None, signals_list=None, etag=None):
+    """
+    Reads one parquet object from S3 into a pyarrow Table. See s3_read_parquet for the arguments.
+    When the disk cache is configured the object is served from the cache.
+    """
+    def read():
+        if _cache is not None:
+            with _cache.pinned(bucket, object_key, etag, get_s3_client()) as local_path:
+                return _read_parquet_source(local_path, columns, filters, signals_list)
+
+        path = f"s3://{bucket}/{object_key}"
+        # Small ranged reads let pyarrow skip column chunks and row groups
+        # that are not needed instead of fetching the whole object.
+        pushdown = columns is not None or filters is not None or signals_list is not None
+        open_kwargs = {"block_size": 2 ** 20} if pushdown else {}
+        with fs.open(path, 'rb', **open_kwargs) as f:
+            return _read_parquet_source(f, columns, filters, signals_list)
+
+    return retry.call("s3", read)
 
 
-def s3_read_parquet(bucket, object_key, date_=None):
+def s3_read_parquet(bucket, object_key, date_=None, columns=None, filters=None, signals_list=None,
+                    etag=None):
+    """
+    Reads one parquet object from S3 into a DataFrame.
+
+    columns: optional list of columns to read. "Date" is always derived from
+        the key and does not need to exist in the file.
+    filters: optional pyarrow filters, as a DNF list or an Expression.
+    signals_list: optional list of SignalIDs to keep, pushed down as a filter.
+    etag: ETag from a listing, if known; saves a HEAD request for the
+        freshness check of the disk cache.
+
+    A missing or unreadable object gives an empty frame. Throttling and
+    transient errors left after retrying, and an open circuit breaker, are
+    raised, so a date range is never returned with days silently missing.
+    """
     if date_ is None:
         match = re.search(r"\d{4}-\d{2}-\d{2}", object_key)
         date_ = match.group(0) if match else None
 
     try:
-        path = f"s3://{bucket}/{object_key}"
-        with fs.open(path, 'rb') as f:
-            df = pq.read_table(f).to_pandas()
+        df = s3_read_parquet_table(bucket, object_key, columns, filters, signals_list, etag).to_pandas()
         df = df[df.columns.difference([col for col in df.columns if col.startswith("__")])]
         if date_:
             df["Date"] = pd.to_datetime(date_).date()
         return df
     except Exception as e:
+        if retry.classify(e) != retry.PERMANENT:
+            raise
         print(f"Failed to read parquet: {e}")
         return pd.DataFrame()
 
 
+def _read_date_range(table_name, start_date, end_date, bucket, s3root, parallel, read_object):
+    """
+    Lists each date prefix of a table and applies read_object(key, etag, date_)
+    to every object, on the shared S3 thread pool when parallel is True.
+    Returns the results in listing order and prints a timing summary.
+    """
+    date_range = pd.date_range(start=pd.to_datetime(start_date), end=pd.to_datetime(end_date))
+    s3 = get_s3_client()
+
+    if parallel:
+        pool = get_io_pool()
+        _map = lambda func, items: list(pool.map(func, items))
+    else:
+        _map = lambda func, items: [func(item) for item in items]
+
+    def list_date(date_):
+        prefix = f"{s3root}/{table_name}/date={date_.date()}/"
+        return [(obj["Key"], obj.get("Size", 0), obj.get("ETag"), date_)
+                for obj in s3_list_objects(bucket, prefix, s3)]
+
+    def timed_read(item):
+        key, size, etag, date_ = item
+        t0 = time.perf_counter()
+        result = read_object(key, etag, date_)
+        elapsed = time.perf_counter() - t0
+        logger.debug(f"Read s3://{bucket}/{key} ({size / 1024 ** 2:.2f} MB) in {elapsed:.2f}s")
+        return result, size, elapsed
+
+    t0 = time.perf_counter()
+    objects = [obj for objs in _map(list_date, date_range) for obj in objs]
+    results = _map(timed_read, objects)
+
+    if results:
+        total_mb = sum(size for _, size, _ in results) / 1024 ** 2
+        slowest = max(elapsed for _, _, elapsed in results)
+        print(f"Read {len(results)} objects ({total_mb:.1f} MB) from {s3root}/{table_name} "
+              f"in {time.perf_counter() - t0:.1f}s (slowest object {slowest:.1f}s)")
+
+    return [result for result, _, _ in results]
+
+
+def s3_read_parquet_arrow(table_name, start_date, end_date, signals_list=None,
+                          bucket=None, parallel=True, s3root="mark",
+                          columns=None, filters=None):
+    """
+    Reads every parquet object of a table for a date range into one pyarrow Table.
+
+    Files stay in Arrow until the end: timestamps are cast to UTC and
+    SignalID/Detector/CallPhase are dictionary-encoded as each file is read,
+    so to_pandas() on the result yields categoricals in a single conversion.
+    """
+    def read_object(key, etag, date_):
+        try:
+            table = s3_read_parquet_table(bucket, key, columns, filters, signals_list, etag)
+            return _normalize_arrow_table(table, date_)
+        except Exception as e:
+            # As in s3_read_parquet, only missing or unreadable objects are skipped
+            if retry.classify(e) != retry.PERMANENT:
+                raise
+            print(f"Failed to read parquet: {e}")
+            return None
+
+    tables = _read_date_range(table_name, start_date, end_date, bucket, s3root, parallel, read_object)
+    tables = [table for table in tables if table is not None and table.num_rows > 0]
+    if not tables:
+        return pa.table({})
+    return pa.concat_tables(tables, promote_options="permissive").unify_dictionaries()
+
+
 def s3_read_parquet_parallel(table_name, start_date, end_date, signals_list=None,
                              bucket=None, callback=lambda x: x,
-                             parallel=False, s3root="mark", usable_cores=4):
-
-    start = pd.to_datetime(start_date)
-    end = pd.to_datetime(end_date)
-    date_range = pd.date_range(start=start, end=end)
-
-    s3 = boto3.client("s3")
-
-    def read_date(date_):
-        prefix = f"{s3root}/{table_name}/date={date_.date()}"
-        response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
-        rows = []
-        if "Contents" in response:
-            for obj in response["Contents"]:
-                key = obj["Key"]
-                df = s3_read_parquet(bucket, key, date_)
-                # Local import to avoid circular dependency
-                import utilities as utils
-                df = utils.convert_to_utc(df)
-                rows.append(callback(df))
-        return pd.concat(rows) if rows else pd.DataFrame()
-
-    if parallel and os.name != 'nt':
-        with ProcessPoolExecutor(max_workers=usable_cores) as executor:
-            dfs = list(executor.map(read_date, date_range))
-    else:
-        dfs = [read_date(d) for d in date_range]
+                             parallel=True, s3root="mark", usable_cores=4,
+                             columns=None, filters=None, arrow=False):
+    """
+    Reads every parquet object of a table for a date range.
+
+    Date prefixes are listed and objects are fetched on the shared S3 thread
+    pool, so requests overlap instead of paying one round trip per file.
+    With parallel=False the same work runs serially in the calling thread.
+    `usable_cores` is kept for backwards compatibility; concurrency is bounded
+    by S3_IO_WORKERS since the work is network bound.
+
+    columns, filters and signals_list are pushed down to each file read, see
+    s3_read_parquet.
+
+    arrow: read through s3_read_parquet_arrow and convert to pandas once at
+        the end, with categorical ID columns. The callback is then applied
+        once to the combined frame instead of to each file.
+    """
+    if arrow:
+        table = s3_read_parquet_arrow(table_name, start_date, end_date, signals_list=signals_list,
+                                      bucket=bucket, parallel=parallel, s3root=s3root,
+                                      columns=columns, filters=filters)
+        return callback(table.to_pandas()) if table.num_rows else pd.DataFrame()
+
+    def read_object(key, etag, date_):
+        df = s3_read_parquet(bucket, key, date_, columns=columns, filters=filters, signals_list=signals_list,
+                             etag=etag)
+        # Local import to avoid circular dependency
+        import utilities as utils
+        return callback(utils.convert_to_utc(df))
 
-    return pd.concat([df for df in dfs if not df.empty], ignore_index=True)
+    dfs = _read_date_range(table_name, start_date, end_date, bucket, s3root, parallel, read_object)
+    dfs = [df for df in dfs if not df.empty]
+    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from adaptive_pool import run_adaptive
+from pipeline import PipelineError
+
+
+def square(i):
+    if i == 3:
+        raise ValueError("bad day")
+    return i * i
+
+
+def test_failures_are_raised_after_other_items_run(tmp_path):
+    settings_file = tmp_path / "worker_settings.json"
+    with pytest.raises(PipelineError) as excinfo:
+        run_adaptive("squares", square, range(6), max_workers=2, settings_file=str(settings_file))
+
+    assert [(stage, item) for stage, item, _ in excinfo.value.failures] == [("squares", 3)]
+    # The stage's settings are still recorded for the next run
+    assert json.loads(settings_file.read_text())["squares"]["workers"] >= 1
+
+
+def test_results_in_item_order(tmp_path):
+    results = run_adaptive("squares", square, [5, 4, 2], max_workers=2,
+                           settings_file=str(tmp_path / "worker_settings.json"))
+    assert results == [25, 16, 4]
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def agg(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # aggregations reads Monthly_Report.yaml from the working directory on import
+    (tmp_path / "Monthly_Report.yaml").write_text("")
+    import aggregations
+    return aggregations
+
+
+@pytest.fixture
+def uptime():
+    """Signal x day uptime with missing values and weights and a repeated SignalID."""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"SignalID": rng.integers(1, 30, 2000),
+                       "Date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 20, 2000), unit="D"),
+                       "uptime": rng.random(2000), "num": rng.integers(1, 10, 2000).astype(float)})
+    df.loc[::7, "uptime"] = np.nan
+    df.loc[::11, "num"] = np.nan
+    return df
+
+
+def old_weighted_mean(df, by, var_, wt_):
+    """The groupby-apply weighted_mean replaced."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return df.groupby(by).apply(lambda x: pd.Series({
+            var_: (x[var_] * x[wt_]).sum() / x[wt_].sum(),
+            wt_: x[wt_].sum()
+        })).reset_index()
+
+
+def assert_frames_match(result, expected, by):
+    result = result.assign(**{col: result[col].astype(str) for col in by}).sort_values(by, ignore_index=True)
+    expected = expected.assign(**{col: expected[col].astype(str) for col in by}).sort_values(by, ignore_index=True)
+    assert len(result) == len(expected)
+    for col in result.columns:
+        if col in by:
+            assert result[col].tolist() == expected[col].tolist()
+        else:
+            np.testing.assert_allclose(result[col].astype(float), expected[col].astype(float), equal_nan=True)
+
+
+def test_weighted_mean_matches_groupby_apply(agg, uptime):
+    result = agg.weighted_mean(uptime, ["SignalID", "Date"], "uptime", "num")
+    expected = old_weighted_mean(uptime, ["SignalID", "Date"], "uptime", "num")
+    assert_frames_match(result, expected, ["SignalID", "Date"])
+
+
+def test_weighted_mean_of_all_missing_weights_is_nan(agg):
+    df = pd.DataFrame({"SignalID": [1, 1, 2], "uptime": [0.5, 1.0, 0.2], "num": [np.nan, np.nan, 2.0]})
+    result = agg.weighted_mean(df, ["SignalID"], "uptime", "num")
+    assert np.isnan(result["uptime"][0]) and result["num"][0] == 0
+    assert result["uptime"][1] == pytest.approx(0.2)
+
+
+def test_grouped_lag_matches_groupby_shift(agg, uptime):
+    df = agg.weighted_mean(uptime, ["SignalID", "Date"], "uptime", "num").sample(frac=1, random_state=0)
+    lag = agg.grouped_lag(df, "uptime", ["SignalID"], ["Date"])
+
+    expected = (df.sort_values(["SignalID", "Date"])
+                .groupby("SignalID")["uptime"].apply(lambda s: s.shift())
+                .reset_index(level=0, drop=True))
+    np.testing.assert_allclose(lag, expected.reindex(df.index), equal_nan=True)
+
+
+def test_add_delta_starts_each_group_without_a_lag(agg):
+    df = pd.DataFrame({"SignalID": [2, 1, 1, 2, 1],
+                       "Date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-01", "2024-01-02", "2024-01-03"]),
+                       "uptime": [0.5, 0.8, 0.4, 1.0, np.nan]})
+    agg.add_delta(df, "uptime", ["SignalID"], ["Date"])
+    np.testing.assert_allclose(df["lag_"], [np.nan, 0.4, np.nan, 0.5, 0.8], equal_nan=True)
+    np.testing.assert_allclose(df["delta"], [np.nan, 1.0, np.nan, 1.0, np.nan], equal_nan=True)
+
+
+def old_group_corridor_by_(df, per_, var_, wt_, corr_grp):
+    """The groupby-apply group_corridor_by_ of the per-subset rollups."""
+    result = old_weighted_mean(df, [per_], var_, wt_)
+    result["Corridor"] = corr_grp
+    result["lag_"] = result[var_].shift()
+    result["delta"] = (result[var_] - result["lag_"]) / result["lag_"]
+    result["Zone_Group"] = corr_grp
+    return result[["Zone_Group", "Corridor", per_, var_, wt_, "delta"]]
+
+
+def test_zone_rollups_match_per_subset_groupby_apply(agg):
+    rng = np.random.default_rng(1)
+    corridors = pd.DataFrame({
+        "Zone_Group": ["RTOP1", "RTOP1", "RTOP2", "RTOP2", None, "Zone 7", "Zone 7", None],
+        "Zone": ["Zone 1", "Zone 1", "Zone 2", "Zone 3", "Zone 3", "Zone 7m", "Zone 7d", "Zone 4"],
+        "Corridor": list("ABCDEFGH"),
+    })
+    df = corridors.merge(pd.DataFrame({"Week": pd.date_range("2024-01-01", periods=6, freq="W-MON")}), how="cross")
+    df["uptime"] = rng.random(len(df))
+    df["num"] = rng.integers(1, 10, len(df)).astype(float)
+    df.loc[::5, "uptime"] = np.nan
+    df.loc[::7, "num"] = np.nan
+    df["delta"] = 0.0
+    # A corridor row repeated in the input appears once in the output, as before
+    df = pd.concat([df, df.iloc[:3]], ignore_index=True)
+
+    result = agg.group_corridors_(df, "Week", "uptime", "num")
+    expected = agg.group_corridors_(df, "Week", "uptime", "num", gr_=old_group_corridor_by_)
+
+    assert_frames_match(result, expected, ["Zone_Group", "Zone", "Corridor", "Week"])
+    # Zone 3 includes its row without a Zone_Group
+    zone_3 = result[(result["Corridor"] == "Zone 3") & result["Zone"].isna()]
+    assert zone_3["num"].sum() == df.drop_duplicates().query("Zone == 'Zone 3'")["num"].sum()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from configs import CorridorDimension
+
+COLUMNS = ["Zone_Group", "Zone", "Corridor", "Subcorridor"]
+
+
+@pytest.fixture
+def corridors():
+    return pd.DataFrame({
+        "SignalID": [3.0, 1.0, 2.0, 5.0, np.nan, 7.0],
+        "Zone_Group": ["RTOP1", "RTOP1", "RTOP2", None, "RTOP2", "RTOP2"],
+        "Zone": ["Zone 1", "Zone 1", "Zone 2", "Zone 3", "Zone 2", "Zone 4"],
+        "Corridor": ["A", "A", "B", "C", "B", None],
+        "Subcorridor": ["A1", None, "B1", "C1", "B2", None],
+    })
+
+
+@pytest.fixture
+def facts():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"SignalID": rng.integers(1, 9, 500), "uptime": rng.random(500)})
+
+
+def old_attach(df, corridors):
+    """The merge CorridorDimension.attach replaced."""
+    df = df.merge(corridors, how="left", on="SignalID")
+    return df[df["Corridor"].notna()]
+
+
+def assert_attached(result, expected):
+    by = ["SignalID", "uptime"] + COLUMNS
+    result = result[by].astype(str).sort_values(by, ignore_index=True)
+    expected = expected[by].astype(str).sort_values(by, ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_attach_by_searchsorted_matches_merge(corridors, facts):
+    dim = CorridorDimension(corridors)
+    assert dim.unique
+    result = dim.attach(facts)
+    assert_attached(result, old_attach(facts, corridors.dropna(subset=["SignalID"])))
+    assert isinstance(result["Corridor"].dtype, pd.CategoricalDtype)
+
+
+def test_attach_with_duplicate_signals_falls_back_to_merge(corridors, facts):
+    corridors = pd.concat([corridors, corridors.iloc[[0]].assign(Corridor="D", Subcorridor="D1")],
+                          ignore_index=True)
+    dim = CorridorDimension(corridors)
+    assert not dim.unique
+    result = dim.attach(facts)
+    assert_attached(result, old_attach(facts, corridors.dropna(subset=["SignalID"])))
+    assert (result["SignalID"] == 3).sum() == 2 * (facts["SignalID"] == 3).sum()
+
+
+def test_attach_keeps_unmatched_rows_without_dropna(corridors, facts):
+    result = CorridorDimension(corridors).attach(facts, ["Corridor"], dropna=False)
+    assert len(result) == len(facts)
+    assert result.loc[facts["SignalID"].isin([4, 6, 7, 8]), "Corridor"].isna().all()
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """duckdb_backend reading a local mark/ tree of a few days of uptime with missing values."""
+    monkeypatch.chdir(tmp_path)
+    # aggregations reads Monthly_Report.yaml from the working directory on import
+    (tmp_path / "Monthly_Report.yaml").write_text("")
+    import duckdb_backend
+
+    rng = np.random.default_rng(0)
+    frames = []
+    for date_ in pd.date_range("2024-01-01", "2024-01-20"):
+        df = pd.DataFrame({"SignalID": rng.integers(1, 20, 300).astype(str),
+                           "uptime": rng.random(300), "num": rng.integers(1, 10, 300).astype(float)})
+        df.loc[::7, "uptime"] = np.nan
+        df.loc[::11, "num"] = np.nan
+        path = tmp_path / "mark" / "detector_uptime_pd" / f"date={date_.date()}"
+        path.mkdir(parents=True)
+        df.to_parquet(path / "part.parquet", index=False)
+        frames.append(df.assign(Date=date_))
+
+    monkeypatch.setattr(duckdb_backend, "_connection", duckdb.connect())
+    monkeypatch.setattr(duckdb_backend, "_source", lambda table_name, bucket, s3root="mark": (
+        f"read_parquet('{tmp_path}/{s3root}/{table_name}/date=*/*.parquet', hive_partitioning = true)"))
+    return duckdb_backend, pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture
+def corridors():
+    return pd.DataFrame({
+        "SignalID": np.arange(1, 17, dtype="float64"),
+        "Zone_Group": ["RTOP1", "RTOP2"] * 8,
+        "Zone": ["Zone 1", "Zone 2", "Zone 3", "Zone 4"] * 4,
+        "Corridor": ["A", "B", "C", "D", "E", "F", "G", None] * 2,
+    })
+
+
+def sort(df, by):
+    df = df.assign(**{col: df[col].astype(str) for col in by if col != by[-1]})
+    return df.sort_values(by, ignore_index=True)
+
+
+def assert_same(result, expected, columns):
+    assert len(result) == len(expected)
+    for col in columns:
+        np.testing.assert_allclose(result[col].astype(float), expected[col].astype(float), equal_nan=True)
+
+
+def test_weighted_period_avg_matches_get_period_avg(backend):
+    import aggregations as agg
+    duckdb_backend, raw = backend
+    result = duckdb_backend.daily_avg("detector_uptime_pd", "uptime", "2024-01-02", "2024-01-19", "bucket",
+                                      wt_="num", signals_list=[1, 2, 3])
+
+    raw = raw[raw["Date"].between("2024-01-02", "2024-01-19") & raw["SignalID"].isin(["1", "2", "3"])]
+    expected = agg.get_period_avg(raw, "uptime", "Date", "num")
+
+    by = ["SignalID", "Date"]
+    assert_same(sort(result, by), sort(expected, by), ["uptime", "num", "delta"])
+
+
+def test_unweighted_period_avg_is_the_plain_mean(backend):
+    duckdb_backend, raw = backend
+    result = duckdb_backend.monthly_avg("detector_uptime_pd", "uptime", "2024-01-01", "2024-01-20", "bucket")
+
+    raw = raw.assign(Month=raw["Date"].dt.to_period("M").dt.to_timestamp())
+    expected = raw.groupby(["SignalID", "Month"])["uptime"].agg(["mean", "count"]).reset_index()
+
+    by = ["SignalID", "Month"]
+    result, expected = sort(result, by), sort(expected, by)
+    assert_same(result.rename(columns={"uptime": "mean", "ones": "count"}), expected, ["mean", "count"])
+
+
+@pytest.mark.parametrize("wt_", ["num", None])
+def test_corridor_avg_matches_weighted_mean_by_corridor(backend, corridors, wt_):
+    import aggregations as agg
+    duckdb_backend, raw = backend
+    result = duckdb_backend.corridor_avg("detector_uptime_pd", "uptime", "Week", corridors,
+                                         "2024-01-01", "2024-01-20", "bucket", wt_=wt_)
+
+    raw = raw.assign(Week=raw["Date"] - pd.to_timedelta(raw["Date"].dt.dayofweek, unit="D"))
+    expected = agg.weighted_mean_by_corridor_(raw, "Week", corridors, "uptime", wt_)
+
+    by = ["Zone_Group", "Zone", "Corridor", "Week"]
+    assert list(result.columns) == list(expected.columns)
+    assert_same(sort(result, by), sort(expected, by), ["uptime", "delta"] + ([wt_] if wt_ else []))
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+import time
+
+import psutil
+
+from memory_profile import tree_rss
+
+
+def test_tree_rss_includes_child_processes():
+    child = subprocess.Popen([sys.executable, "-c", "import time; x = bytearray(50 * 1024 ** 2); time.sleep(30)"])
+    try:
+        process = psutil.Process()
+        # Wait until the child holds its allocation
+        while psutil.Process(child.pid).memory_info().rss < 50 * 1024 ** 2:
+            time.sleep(0.01)
+        assert tree_rss(process) >= process.memory_info().rss + 50 * 1024 ** 2
+    finally:
+        child.kill()
+        child.wait()
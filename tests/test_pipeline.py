@@ -0,0 +1,30 @@
+import pytest
+
+from pipeline import run_pipeline, PipelineError
+
+
+def test_runs_every_item_in_order():
+    written = []
+    run_pipeline(range(5), read=lambda i: i, compute=lambda i, data: data * 10,
+                 write=lambda i, result: written.append(result))
+    assert written == [0, 10, 20, 30, 40]
+
+
+def test_failures_are_raised_after_other_items_run():
+    written = []
+
+    def read(i):
+        if i == 1:
+            raise OSError("download failed")
+        return i
+
+    def write(i, result):
+        if i == 3:
+            raise OSError("upload failed")
+        written.append(i)
+
+    with pytest.raises(PipelineError) as excinfo:
+        run_pipeline(range(5), read=read, compute=lambda i, data: data, write=write)
+
+    assert written == [0, 2, 4]
+    assert [(stage, item) for stage, item, _ in excinfo.value.failures] == [("read", 1), ("write", 3)]
@@ -0,0 +1,114 @@
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+import retry
+
+
+def client_error(code, status):
+    return ClientError({"Error": {"Code": code, "Message": code},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, "GetObject")
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(retry, "_breakers", {})
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+
+
+@pytest.mark.parametrize("exc, kind", [
+    (client_error("SlowDown", 503), retry.THROTTLE),
+    (client_error("ThrottlingException", 400), retry.THROTTLE),
+    (client_error("InternalError", 500), retry.TRANSIENT),
+    (client_error("NoSuchKey", 404), retry.PERMANENT),
+    (client_error("PreconditionFailed", 412), retry.PERMANENT),
+    (EndpointConnectionError(endpoint_url="https://s3"), retry.TRANSIENT),
+    (FileNotFoundError("key"), retry.PERMANENT),
+    (RuntimeError("Rate exceeded"), retry.THROTTLE),
+    (RuntimeError("connection reset"), retry.TRANSIENT),
+    (retry.CircuitOpenError("open"), retry.THROTTLE),
+])
+def test_classify(exc, kind):
+    assert retry.classify(exc) == kind
+
+
+def test_permanent_errors_do_not_open_breaker():
+    def missing():
+        raise client_error("NoSuchKey", 404)
+
+    for _ in range(20):
+        with pytest.raises(ClientError):
+            retry.call("s3", missing)
+
+    assert retry.get_breaker("s3").opened_at is None
+    assert retry.call("s3", lambda: "ok") == "ok"
+
+
+def test_breaker_opens_and_half_opens(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    breaker = retry.CircuitBreaker("s3", failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+
+    with pytest.raises(retry.CircuitOpenError):
+        breaker.before_call()
+
+    # Half-open: one trial call after reset_timeout, others still fail fast
+    now[0] = 31
+    breaker.before_call()
+    with pytest.raises(retry.CircuitOpenError):
+        breaker.before_call()
+
+    # A failed trial reopens the circuit, a successful one closes it
+    breaker.record_failure()
+    with pytest.raises(retry.CircuitOpenError):
+        breaker.before_call()
+    now[0] = 62
+    breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+
+
+def test_open_circuit_waits_for_reset_then_retries(monkeypatch):
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(retry.time, "sleep", sleep)
+    breaker = retry.get_breaker("s3")
+    breaker.opened_at = 0.0
+
+    assert retry.call("s3", lambda: "ok") == "ok"
+    assert slept and slept[0] >= breaker.reset_timeout
+    assert breaker.opened_at is None
+
+
+def test_open_circuit_error_carries_retry_after(monkeypatch):
+    monkeypatch.setattr(retry.time, "monotonic", lambda: 10.0)
+    breaker = retry.CircuitBreaker("s3", failure_threshold=1, reset_timeout=30)
+    breaker.opened_at = 0.0
+    with pytest.raises(retry.CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(20.0)
+
+
+def test_hung_timed_calls_do_not_block_later_ones():
+    release = retry.threading.Event()
+    for _ in range(10):
+        with pytest.raises(TimeoutError):
+            retry._call_with_timeout(release.wait, 0.01)
+    assert retry._call_with_timeout(lambda: "ok", 1) == "ok"
+    release.set()
+
+
+def test_timed_call_raises_its_own_error():
+    def fail():
+        raise KeyError("missing")
+
+    with pytest.raises(KeyError):
+        retry._call_with_timeout(fail, 1)
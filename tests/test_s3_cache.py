@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from s3_cache import S3ObjectCache
+
+
+class FakeS3:
+    """Serves objects of 100 bytes, with the key as ETag."""
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": f'"{Key}"'}
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, "wb") as f:
+            f.write(b"x" * 100)
+
+
+def test_hits_and_misses_are_counted_across_threads(tmp_path):
+    cache = S3ObjectCache(tmp_path, max_bytes=10 ** 6)
+    keys = [f"k{i % 5}" for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda key: cache.fetch("bucket", key, s3=FakeS3()), keys))
+    assert cache.hits + cache.misses == 200
+    assert cache.misses >= 5
+
+
+def test_pinned_file_is_not_evicted(tmp_path):
+    cache = S3ObjectCache(tmp_path, max_bytes=150)
+    s3 = FakeS3()
+    with cache.pinned("bucket", "a", s3=s3) as path:
+        # Fetching another object takes the cache over max_bytes
+        cache.fetch("bucket", "b", s3=s3)
+        assert os.path.exists(path)
+    cache.fetch("bucket", "c", s3=s3)
+    assert not os.path.exists(path)
+
+
+def test_running_total_follows_inserts_and_evictions(tmp_path):
+    cache = S3ObjectCache(tmp_path, max_bytes=250)
+    s3 = FakeS3()
+    a = cache.fetch("bucket", "a", s3=s3)
+    cache.fetch("bucket", "b", s3=s3)
+    # A hit makes "a" the most recently used, so "b" is evicted for "c"
+    cache.fetch("bucket", "a", s3=s3)
+    cache.fetch("bucket", "c", s3=s3)
+    assert cache.total_bytes == 200
+    assert os.path.exists(a) and not os.path.exists(cache.path_for("bucket", "b", '"b"'))
+
+    # A new cache over the same directory starts from its files
+    assert S3ObjectCache(tmp_path, max_bytes=250).total_bytes == 200
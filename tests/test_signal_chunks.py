@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from utilities import plan_signal_chunks, get_signals_chunks
+
+
+def test_chunks_stay_within_the_budget():
+    row_counts = pd.Series([6, 6, 6], index=[1, 2, 3])
+    assert plan_signal_chunks(row_counts, 1, 10) == [[1], [2], [3]]
+
+    rng = np.random.default_rng(0)
+    row_counts = pd.Series(rng.integers(1, 10, 200), index=np.arange(200))
+    chunks = plan_signal_chunks(row_counts, 1, 25)
+    assert sorted(s for chunk in chunks for s in chunk) == list(range(200))
+    assert all(row_counts[chunk].sum() <= 25 for chunk in chunks)
+
+
+def test_signal_over_the_budget_gets_a_chunk_of_its_own():
+    row_counts = pd.Series([30, 4, 3, 2], index=[1, 2, 3, 4])
+    assert plan_signal_chunks(row_counts, 1, 10) == [[1], [2, 3, 4]]
+
+
+def test_get_signals_chunks_uses_the_configured_budget(monkeypatch):
+    import utilities
+    df = pd.DataFrame({"SignalID": np.repeat([1, 2, 3, 4], 100), "vol": 1.0})
+    bytes_per_row = df.memory_usage(deep=True).sum() / len(df)
+
+    assert get_signals_chunks(df) == [[1, 2, 3, 4]]
+    monkeypatch.setattr(utilities, "_signal_chunk_budget", 200 * bytes_per_row)
+    assert get_signals_chunks(df) == [[1, 2], [3, 4]]
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from utilities import build_signal_details
+
+
+def counts(signal_ids, value, name):
+    n = len(signal_ids)
+    return pd.DataFrame({
+        "SignalID": signal_ids,
+        "Date": pd.Timestamp("2024-01-01"),
+        "Timeperiod": pd.date_range("2024-01-01", periods=n, freq="h"),
+        "Detector": [1] * n,
+        "CallPhase": [2] * n,
+        name: value,
+    })
+
+
+def test_rows_without_a_signal_are_dropped():
+    signal_ids = ["2", None, "1", "2", "x"]
+    rc = counts(signal_ids, [10, 20, 30, 40, 50], "vol")
+    fc = counts(signal_ids, [1, 1, 0, 1, 1], "Good_Day")
+    ac = counts(signal_ids, [11, 21, 31, 41, 51], "vol")
+
+    table = build_signal_details(rc, fc, ac)
+
+    assert table["SignalID"].to_pylist() == [1, 2]
+    data = table["data"].to_pylist()
+    assert [row["vol_rc"] for row in data[0]] == [30]
+    assert [row["vol_ac"] for row in data[0]] == [31]
+    assert [row["vol_rc"] for row in data[1]] == [10, 40]
+    assert [row["vol_ac"] for row in data[1]] == [None, None]
@@ -0,0 +1,44 @@
+import io
+
+import utilities
+
+
+class FakeFS:
+    """Keeps written files in memory."""
+
+    def __init__(self):
+        self.files = {}
+
+    def open(self, path, mode="rb"):
+        if "w" in mode:
+            fs = self
+
+            class Writer(io.BytesIO):
+                def close(self):
+                    fs.files[path] = self.getvalue()
+                    super().close()
+
+            return Writer()
+        if path not in self.files:
+            raise FileNotFoundError(path)
+        return io.BytesIO(self.files[path])
+
+
+def test_dates_without_signals_are_listed_once(monkeypatch):
+    listings = {"2024-01-01": [3, 1], "2024-01-02": [], "2024-01-03": [2]}
+    listed = []
+
+    def get_signalids_from_s3(date_, s3bucket, s3prefix):
+        listed.append(date_)
+        return listings[date_]
+
+    monkeypatch.setattr(utilities, "fs", FakeFS())
+    monkeypatch.setattr(utilities, "get_signalids_from_s3", get_signalids_from_s3)
+
+    dates = list(listings)
+    assert utilities.update_signal_inventory("bucket", dates, refresh_days=0).shape == (4, 2)
+    assert sorted(listed) == dates
+
+    listed.clear()
+    assert utilities.get_signals_list("bucket", "2024-01-01", "2024-01-03") == [1, 2, 3]
+    assert listed == []
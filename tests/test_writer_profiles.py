@@ -0,0 +1,68 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import s3_parquet_io as s3_io
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    def configure(overrides):
+        monkeypatch.setattr(s3_io, "_writer_profiles", overrides)
+    return configure
+
+
+def test_default_profile(profiles):
+    profiles({})
+    assert s3_io.get_writer_profile("counts_1hr") == s3_io.DEFAULT_WRITER_PROFILE
+
+
+def test_table_overrides_default(profiles):
+    profiles({"default": {"compression_level": 6, "row_group_size": 1000},
+              "counts_1hr": {"row_group_size": 2000}})
+    profile = s3_io.get_writer_profile("counts_1hr")
+    assert profile["compression_level"] == 6
+    assert profile["row_group_size"] == 2000
+    assert s3_io.get_writer_profile("counts_15min")["row_group_size"] == 1000
+
+
+def test_changing_the_codec_drops_the_inherited_level(profiles):
+    profiles({"counts_1hr": {"compression": "snappy"}})
+    assert s3_io.get_writer_profile("counts_1hr")["compression_level"] is None
+
+    profiles({"counts_1hr": {"compression": "gzip", "compression_level": 6}})
+    assert s3_io.get_writer_profile("counts_1hr")["compression_level"] == 6
+
+
+@pytest.mark.parametrize("compression, level, expected", [
+    ("zstd", 3, 3),
+    ("gzip", 6, 6),
+    ("snappy", 6, None),
+    ("none", 6, None),
+    (None, 6, None),
+    ("zstd", None, None),
+])
+def test_compression_level_only_for_codecs_that_take_one(compression, level, expected):
+    profile = dict(s3_io.DEFAULT_WRITER_PROFILE, compression=compression, compression_level=level)
+    kwargs = s3_io._writer_kwargs(profile, ["SignalID", "vol"])
+    assert kwargs.get("compression_level") == expected
+    assert kwargs["compression"] == compression
+
+
+def test_dictionary_columns_limited_to_the_table():
+    kwargs = s3_io._writer_kwargs(s3_io.DEFAULT_WRITER_PROFILE, ["SignalID", "vol"])
+    assert kwargs["use_dictionary"] == ["SignalID"]
+
+
+@pytest.mark.parametrize("overrides", [
+    {"compression": "snappy"},
+    {"compression": "none"},
+    {"compression": "gzip", "compression_level": 6},
+    {"compression_level": 6},
+])
+def test_profile_overrides_write(tmp_path, profiles, overrides):
+    profiles({"counts_1hr": overrides})
+    profile = s3_io.get_writer_profile("counts_1hr")
+    table = pa.table({"SignalID": ["1", "2"], "vol": [10, 20]})
+    s3_io.write_parquet_table(table, str(tmp_path / "t.parquet"), profile)
+    assert pq.read_table(tmp_path / "t.parquet").equals(table)
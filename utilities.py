@@ -1,3 +1,4 @@
+import io
 import os
 import re
 import yaml
@@ -5,11 +6,14 @@ import sys
 import boto3
 import s3fs
 import psutil
+import numpy as np
 import pandas as pd
 from botocore.exceptions import NoCredentialsError
 import logging
 import pyarrow as pa
 import pyarrow.parquet as pq
+import pyarrow.compute as pc
+import heapq
 from functools import reduce
 import datetime
 from pathlib import Path
@@ -17,16 +21,21 @@ import joblib
 import time
 from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import multiprocessing
+import watermarks
+import retry
+import artifact_store
+import memory_profile
 
 fs = s3fs.S3FileSystem()
 
 
 def get_cor(bucket, object_key):
-    """Reads a .qs file from S3 bucket."""
-    s3 = boto3.client('s3')
+    """Reads a corridors artifact (.feather, see artifact_store) or a legacy .qs file from S3 bucket."""
     try:
-        response = s3.get_object(Bucket=bucket, Key=object_key)
-        return pd.read_qs(response['Body'])
+        if Path(object_key).suffix == ".qs":
+            response = boto3.client('s3').get_object(Bucket=bucket, Key=object_key)
+            return joblib.load(io.BytesIO(response['Body'].read()))
+        return artifact_store.get_artifact(bucket, object_key)
     except NoCredentialsError:
         logging.error("Credentials not available.")
         return None
@@ -60,12 +69,13 @@ def get_date_from_string(x, s3bucket=None, s3prefix=None, table_include_regex_pa
         return (datetime.date.today() - datetime.timedelta(days=days_ago)).strftime("%Y-%m-%d")
     elif x == "first_missing":
         if s3bucket and s3prefix:
-            # Fetch objects from S3 bucket
-            s3 = boto3.client('s3')
-            objects = s3.list_objects_v2(Bucket=s3bucket, Prefix=s3prefix)
-            all_dates = [re.search(r"(?<=date=)(\d+-\d+-\d+)", obj['Key']).group() for obj in objects.get('Contents', [])]
-            first_missing = pd.to_datetime(max(all_dates)) + pd.Timedelta(days=1)
-            return min(first_missing, pd.to_datetime(datetime.date.today() - datetime.timedelta(days=1)))
+            # Last completed date from the table's watermark, without listing the table
+            yesterday = pd.to_datetime(datetime.date.today() - datetime.timedelta(days=1))
+            last_date = watermarks.get_last_completed_date(s3bucket, s3prefix)
+            if last_date is None:
+                return yesterday
+            first_missing = pd.to_datetime(last_date) + pd.Timedelta(days=1)
+            return min(first_missing, yesterday)
         else:
             # Placeholder for database logic
             logging.info("Start date determined from database.")
@@ -77,13 +87,73 @@ def get_date_from_string(x, s3bucket=None, s3prefix=None, table_include_regex_pa
 
 def get_signalids_from_s3(date_, s3bucket, s3prefix="atspm"):
     """Gets signal IDs from S3 bucket."""
+    # Local import to avoid circular dependency
+    from s3_parquet_io import s3_list_objects
+
     if isinstance(date_, datetime.date):
         date_ = date_.strftime("%Y-%m-%d")
-    s3 = boto3.client('s3')
-    objects = s3.list_objects_v2(Bucket=s3bucket, Prefix=f"{s3prefix}/date={date_}")
-    keys = [obj['Key'] for obj in objects.get('Contents', [])]
-    signalids = sorted([int(re.search(rf"(?<={s3prefix}_)\d+", key).group()) for key in keys if re.search(rf"(?<={s3prefix}_)\d+", key)])
-    return signalids
+    pattern = re.compile(rf"(?<={s3prefix}_)\d+")
+    objects = s3_list_objects(s3bucket, f"{s3prefix}/date={date_}/")
+    matches = (pattern.search(obj['Key']) for obj in objects)
+    return sorted(int(match.group()) for match in matches if match)
+
+
+def signal_inventory_key(s3prefix="atspm"):
+    return f"{s3prefix}/signal_inventory/signal_inventory.parquet"
+
+
+def read_signal_inventory(s3bucket, s3prefix="atspm"):
+    """
+    Reads the Date -> SignalID inventory, or an empty one if none exists yet.
+    A date that was listed without any signals has one row with a missing
+    SignalID, so it is not listed again.
+    """
+    try:
+        with fs.open(f"s3://{s3bucket}/{signal_inventory_key(s3prefix)}", "rb") as f:
+            return pd.read_parquet(f).astype({"SignalID": "Int64"})
+    except FileNotFoundError:
+        return pd.DataFrame({"Date": pd.Series(dtype="str"), "SignalID": pd.Series(dtype="Int64")})
+
+
+def update_signal_inventory(s3bucket, dates, s3prefix="atspm", refresh_days=2, max_workers=16):
+    """
+    Brings the persisted signal inventory up to date for the given dates.
+
+    Only dates missing from the inventory are listed, plus the last
+    `refresh_days` days, which may still be receiving files. The inventory is
+    written back to S3 when anything changed and returned as a DataFrame.
+    """
+    inventory = read_signal_inventory(s3bucket, s3prefix)
+    known = set(inventory["Date"])
+    recent = (datetime.date.today() - datetime.timedelta(days=refresh_days)).strftime("%Y-%m-%d")
+    dates = sorted({pd.Timestamp(d).strftime("%Y-%m-%d") for d in dates})
+    to_list = [d for d in dates if d not in known or d >= recent]
+    if not to_list:
+        return inventory
+
+    print(f"Listing signals for {len(to_list)} dates not in the signal inventory")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        listed = list(executor.map(lambda d: get_signalids_from_s3(d, s3bucket, s3prefix), to_list))
+
+    # A date without signals keeps a marker row with a missing SignalID
+    listed = [signalids or [None] for signalids in listed]
+    new_rows = pd.DataFrame({
+        "Date": [d for d, signalids in zip(to_list, listed) for _ in signalids],
+        "SignalID": [s for signalids in listed for s in signalids],
+    }).astype({"Date": "str", "SignalID": "Int64"})
+    inventory = pd.concat([inventory[~inventory["Date"].isin(to_list)], new_rows], ignore_index=True)
+    inventory = inventory.sort_values(["Date", "SignalID"], ignore_index=True)
+    with fs.open(f"s3://{s3bucket}/{signal_inventory_key(s3prefix)}", "wb") as f:
+        inventory.to_parquet(f, index=False)
+    return inventory
+
+
+def get_signals_list(s3bucket, start_date, end_date, s3prefix="atspm"):
+    """Gets the sorted SignalIDs with data on any date in the range, from the signal inventory."""
+    dates = pd.date_range(start=pd.Timestamp(start_date).normalize(), end=pd.Timestamp(end_date).normalize())
+    inventory = update_signal_inventory(s3bucket, dates, s3prefix)
+    in_range = inventory["Date"].isin(dates.strftime("%Y-%m-%d")) & inventory["SignalID"].notna()
+    return sorted(int(s) for s in inventory.loc[in_range, "SignalID"].unique())
 
 
 def get_last_modified_s3(bucket, object_key):
@@ -127,166 +197,237 @@ def convert_to_utc(df):
 
 
 
-def keep_trying(func, n_tries, *args, sleep=1, timeout=None, **kwargs):
+def keep_trying(func, n_tries, *args, service, sleep=1, timeout=None, **kwargs):
     """
-    Retry a function call up to `n_tries` times with exponential backoff and optional timeout.
+    Retry a function call up to `n_tries` times with jittered exponential backoff and optional timeout.
+    Throttling and transient errors are retried; permanent errors (access denied, missing key,
+    bad arguments) fail at once. See retry.py.
 
     Parameters:
         func: Callable to retry.
         n_tries: Maximum number of attempts.
         *args, **kwargs: Arguments to pass to the function.
-        sleep: Initial sleep time between retries (doubles each retry).
+        sleep: Initial backoff between retries (doubles each retry).
         timeout: Optional timeout (in seconds) for each function execution.
+        service: Circuit breaker and retry counters to account the calls under. Required, so
+            unrelated call sites do not open each other's circuit; name it after the call site.
     Returns:
         The function's return value if successful, or None if all attempts fail.
     """
-    attempt = 1
-    result = None
-
-    while attempt <= n_tries:
-        try:
-            if timeout is not None:
-                with ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(func, *args, **kwargs)
-                    result = future.result(timeout=timeout)
-            else:
-                result = func(*args, **kwargs)
+    policy = retry.RetryPolicy(max_attempts=n_tries, base_delay=sleep, timeout=timeout)
+    try:
+        return policy.call(func, *args, service=service, **kwargs)
+    except Exception as e:
+        print(f"[keep_trying] Giving up: {str(e).strip()}")
+        return None
 
-            if attempt > 1:
-                print(f"[keep_trying] Attempt {attempt} succeeded.")
-            return result
 
-        except Exception as e:
-            print(f"[keep_trying] Attempt {attempt} failed: {str(e).strip()}")
-            # Uncomment to print traceback:
-            # traceback.print_exc()
+SIGNAL_DETAIL_KEYS = ["SignalID", "Date", "Timeperiod", "Detector", "CallPhase"]
 
-        attempt += 1
-        time.sleep(sleep)
-        sleep *= 2
 
-    return None
+def _as_int64(s):
+    """Nullable integer IDs, whether they were read as strings, categories or numbers."""
+    if pd.api.types.is_numeric_dtype(s) and not isinstance(s.dtype, pd.CategoricalDtype):
+        return s.astype("Int64")
+    # Parse each distinct ID once rather than every row
+    codes, uniques = pd.factorize(s)
+    values = pd.to_numeric(pd.Series(np.asarray(uniques, dtype=object)), errors="coerce").astype("Int64")
+    return pd.Series(values.take(codes).to_numpy(), index=s.index).where(codes >= 0).astype("Int64")
 
 
-def write_signal_details(plot_date, conf, signals_list=None):
+def build_signal_details(rc, fc, ac):
+    """
+    Builds the signal_details table from raw (rc), filtered (fc) and adjusted (ac)
+    hourly counts: one row per SignalID with a list<struct> column `data` holding
+    that signal's hourly rows. vol_ac is kept only on bad days (Good_Day == 0).
+    The list offsets come from the run boundaries of the sorted SignalID, so no
+    per-signal frames are built.
+    """
+    frames = []
+    for df, value, name in [(rc, "vol", "vol_rc"), (fc, "Good_Day", "Good_Day"), (ac, "vol", "vol_ac")]:
+        df = convert_to_utc(df[SIGNAL_DETAIL_KEYS + [value]].rename(columns={value: name}))
+        for col in ["SignalID", "Detector", "CallPhase"]:
+            df[col] = _as_int64(df[col])
+        frames.append(df)
+
+    df = reduce(lambda left, right: pd.merge(left, right, on=SIGNAL_DETAIL_KEYS, how="outer"), frames)
+    # Rows without a SignalID belong to no signal; they would otherwise form a group of their own
+    df = df.dropna(subset=["SignalID"])
+    df["vol_rc"] = df["vol_rc"].astype("Int64")
+    df["bad_day"] = df["Good_Day"].eq(0).fillna(False).astype(bool)
+    df["vol_ac"] = df["vol_ac"].astype("Int64").where(df["bad_day"])
+
+    df = df.sort_values(by=["SignalID", "Detector", "Timeperiod"], ignore_index=True)
+    df["Hour"] = df["Timeperiod"].dt.hour
+    df = df.drop(columns=["Timeperiod"])
+
+    signal_ids = df["SignalID"].to_numpy(dtype="int64")
+    starts = np.flatnonzero(np.r_[True, signal_ids[1:] != signal_ids[:-1]]) if len(df) else np.array([], "int64")
+    offsets = pa.array(np.r_[starts, len(df)], type=pa.int32())
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = [name for name in table.column_names if name != "SignalID"]
+    data = pa.StructArray.from_arrays([table[name].combine_chunks() for name in fields], names=fields)
+    return pa.table({
+        "SignalID": table["SignalID"].combine_chunks().take(pa.array(starts)),
+        "data": pa.ListArray.from_arrays(offsets, data),
+    })
+
+
+def upload_signal_details(table, plot_date, conf):
+    """Writes a table from build_signal_details to mark/signal_details/date=<plot_date>/."""
+    # Local import to avoid circular dependency
+    from s3_parquet_io import get_writer_profile, write_parquet_table
+
+    table_name = "signal_details"
+    prefix = "sg"
+    fn = f"{prefix}_{plot_date}"
+    s3_path = f"s3://{conf['bucket']}/mark/{table_name}/date={plot_date}/{fn}.parquet"
+
+    def write_parquet():
+        with fs.open(s3_path, 'wb') as f:
+            write_parquet_table(table, f, get_writer_profile(table_name))
+
+    retry.call("s3", write_parquet)
+
+
+def write_signal_details(plot_date, conf, signals_list=None, rc=None, fc=None, ac=None):
+    """
+    Builds and writes signal_details for a day. Raw (rc), filtered (fc) and
+    adjusted (ac) hourly counts the caller already holds in memory are used
+    as given; the others are read from S3.
+    """
     print(f"Writing signal details for {plot_date}")
     try:
         # Local import to avoid circular dependency
         from s3_parquet_io import s3_read_parquet
-        
+
+        detail_columns = SIGNAL_DETAIL_KEYS
         # Read raw counts
-        rc = s3_read_parquet(
-            bucket=conf["bucket"],
-            object_key=f"mark/counts_1hr/date={plot_date}/counts_1hr_{plot_date}.parquet",
-            date_=plot_date
-        )
+        if rc is None:
+            rc = s3_read_parquet(
+                bucket=conf["bucket"],
+                object_key=f"mark/counts_1hr/date={plot_date}/counts_1hr_{plot_date}.parquet",
+                date_=plot_date,
+                columns=detail_columns + ["vol"],
+                signals_list=signals_list
+            )
         if rc.empty:
             return
 
-        rc = convert_to_utc(rc)[["SignalID", "Date", "Timeperiod", "Detector", "CallPhase", "vol"]]
-
         # Read filtered counts
-        fc = s3_read_parquet(
-            bucket=conf["bucket"],
-            object_key=f"mark/filtered_counts_1hr/date={plot_date}/filtered_counts_1hr_{plot_date}.parquet",
-            date_=plot_date
-        )
+        if fc is None:
+            fc = s3_read_parquet(
+                bucket=conf["bucket"],
+                object_key=f"mark/filtered_counts_1hr/date={plot_date}/filtered_counts_1hr_{plot_date}.parquet",
+                date_=plot_date,
+                columns=detail_columns + ["Good_Day"],
+                signals_list=signals_list
+            )
         if fc.empty:
             return
 
-        fc = convert_to_utc(fc)[["SignalID", "Date", "Timeperiod", "Detector", "CallPhase", "Good_Day"]]
-
         # Read adjusted counts
-        ac = s3_read_parquet(
-            bucket=conf["bucket"],
-            object_key=f"mark/adjusted_counts_1hr/date={plot_date}/adjusted_counts_1hr_{plot_date}.parquet",
-            date_=plot_date
-        )
+        if ac is None:
+            ac = s3_read_parquet(
+                bucket=conf["bucket"],
+                object_key=f"mark/adjusted_counts_1hr/date={plot_date}/adjusted_counts_1hr_{plot_date}.parquet",
+                date_=plot_date,
+                columns=detail_columns + ["vol"],
+                signals_list=signals_list
+            )
         if ac.empty:
             return
 
-        ac = convert_to_utc(ac)[["SignalID", "Date", "Timeperiod", "Detector", "CallPhase", "vol"]]
+        upload_signal_details(build_signal_details(rc, fc, ac), plot_date, conf)
 
-        # Filter if signals list is provided
-        if signals_list is not None:
-            rc = rc[rc["SignalID"].astype(str).isin(signals_list)]
-            fc = fc[fc["SignalID"].astype(str).isin(signals_list)]
-            ac = ac[ac["SignalID"].astype(str).isin(signals_list)]
-
-        # Merge datasets
-        rc = rc.rename(columns={"vol": "vol_rc"})
-        ac = ac.rename(columns={"vol": "vol_ac"})
-
-        df = reduce(lambda left, right: pd.merge(
-            left, right, on=["SignalID", "Date", "Timeperiod", "Detector", "CallPhase"], how='outer'),
-            [rc, fc, ac])
+    except Exception as e:
+        print(f"Can't write signal details for {plot_date}: {e}")
 
-        df["bad_day"] = df["Good_Day"].apply(lambda x: x == 0)
-        df["SignalID"] = df["SignalID"].astype("Int64")
-        df["Detector"] = df["Detector"].astype("Int64")
-        df["CallPhase"] = df["CallPhase"].astype("Int64")
-        df["vol_rc"] = df["vol_rc"].astype("Int64")
-        df["vol_ac"] = df.apply(lambda row: row["vol_ac"] if row["bad_day"] else pd.NA, axis=1).astype("Int64")
 
-        df = df.sort_values(by=["SignalID", "Detector", "Timeperiod"])
+def cleanup_cycle_data(date_):
+    """Removes local cycles and detections files for a given date."""
+    print(f"Removing local cycles and detections files for {date_}")
+    os.system(f"rm -r -f ../cycles/date={date_}")
+    os.system(f"rm -r -f ../detections/date={date_}")
 
-        # Add hour, nest by SignalID
-        df["Hour"] = pd.to_datetime(df["Timeperiod"]).dt.hour
-        df = df.drop(columns=["Timeperiod"])
 
-        grouped = df.groupby("SignalID")
-        nested_df = pd.DataFrame({
-            "SignalID": grouped.groups.keys(),
-            "data": [group.drop(columns=["SignalID"]).reset_index(drop=True) for _, group in grouped]
-        })
+def count_rows_per_signal(source):
+    """
+    Returns rows per SignalID as a Series. source is a DataFrame, a pyarrow
+    Table, or a parquet path/dataset, of which only the SignalID column is read.
+    """
+    if isinstance(source, pd.DataFrame):
+        return source["SignalID"].value_counts(sort=False)
+    if not isinstance(source, pa.Table):
+        source = pq.read_table(source, columns=["SignalID"], filesystem=fs if str(source).startswith("s3") else None)
+    counts = pc.value_counts(source["SignalID"].combine_chunks()).flatten()
+    return pd.Series(counts[1].to_numpy(), index=counts[0].to_pandas(), name="count")
 
-        # Save to S3
-        table_name = "signal_details"
-        prefix = "sg"
-        fn = f"{prefix}_{plot_date}"
-        s3_path = f"s3://{conf['bucket']}/mark/{table_name}/date={plot_date}/{fn}.parquet"
 
-        def write_parquet():
-            table = pa.Table.from_pandas(nested_df, preserve_index=False)
-            with fs.open(s3_path, 'wb') as f:
-                pq.write_table(table, f, use_deprecated_int96_timestamps=True)
+# Bytes of data per chunk of signals, set from the `signal_chunks` section
+# of Monthly_Report.yaml; None chunks by row count.
+_signal_chunk_budget = None
 
-        keep_trying(write_parquet, n_tries=5)
 
-    except Exception as e:
-        print(f"Can't write signal details for {plot_date}: {e}")
+def configure_signal_chunks(memory_budget_mb=None):
+    """Sets the default memory_budget of get_signals_chunks and get_signals_chunks_arrow."""
+    global _signal_chunk_budget
+    _signal_chunk_budget = memory_budget_mb * 1024 ** 2 if memory_budget_mb else None
 
 
-def cleanup_cycle_data(date_):
-    """Removes local cycles and detections files for a given date."""
-    print(f"Removing local cycles and detections files for {date_}")
-    os.system(f"rm -r -f ../cycles/date={date_}")
-    os.system(f"rm -r -f ../detections/date={date_}")
+def plan_signal_chunks(row_counts, bytes_per_row, memory_budget):
+    """
+    Bin-packs signals into chunks of at most memory_budget bytes each, from
+    rows per signal (a Series indexed by SignalID) times bytes_per_row.
+    Largest signals are placed first, each into the currently lightest chunk
+    if it fits there and into a new chunk otherwise, so chunks come out
+    balanced. A signal larger than the budget gets a chunk of its own.
+    Signals are sorted within each chunk.
+    """
+    if len(row_counts) == 0:
+        return []
+    sizes = row_counts.astype("float64") * bytes_per_row
+    heap = []
+    chunks = []
+    for signal_id, size in sizes.sort_values(ascending=False, kind="stable").items():
+        if heap and heap[0][0] + size <= memory_budget:
+            load, i = heapq.heappop(heap)
+        else:
+            load, i = 0.0, len(chunks)
+            chunks.append([])
+        chunks[i].append(signal_id)
+        heapq.heappush(heap, (load + size, i))
+    return [sorted(chunk) for chunk in chunks]
 
 
-def get_signals_chunks(df, rows=1e6):
-    """Splits a dataframe into chunks of size 'rows'."""
-    signals_list = df['SignalID'].drop_duplicates().sort_values().tolist()
-    records = len(df)
-    chunk_length = round(rows / (records / len(signals_list)))
-    return [signals_list[i:i + chunk_length] for i in range(0, len(signals_list), chunk_length)]
+def get_signals_chunks(df, rows=1e6, memory_budget=None):
+    """
+    Splits the signals of a dataframe into chunks of at most memory_budget
+    bytes of the frame (by default the configured `signal_chunks` budget) or
+    else of about 'rows' rows, balanced on the actual rows of each signal.
+    """
+    if df.empty:
+        return []
+    bytes_per_row = df.memory_usage(deep=True).sum() / len(df)
+    memory_budget = memory_budget or _signal_chunk_budget or rows * bytes_per_row
+    return plan_signal_chunks(count_rows_per_signal(df), bytes_per_row, memory_budget)
 
 
-def get_signals_chunks_arrow(df, rows=1e6):
-    """Splits an Arrow dataframe into chunks of size 'rows'."""
-    signals_list = df['SignalID'].unique().tolist()
-    records = len(df)
-    chunk_length = round(rows / (records / len(signals_list)))
-    return [signals_list[i:i + chunk_length] for i in range(0, len(signals_list), chunk_length)]
+def get_signals_chunks_arrow(df, rows=1e6, memory_budget=None):
+    """Splits the signals of an Arrow table into chunks. See get_signals_chunks."""
+    if df.num_rows == 0:
+        return []
+    bytes_per_row = df.nbytes / df.num_rows
+    memory_budget = memory_budget or _signal_chunk_budget or rows * bytes_per_row
+    return plan_signal_chunks(count_rows_per_signal(df), bytes_per_row, memory_budget)
 
 
 
 def show_largest_objects(n=20):
-    """Displays the largest objects in memory."""
-    objects = {name: sys.getsizeof(obj) for name, obj in globals().items()}
-    largest_objects = sorted(objects.items(), key=lambda x: x[1], reverse=True)[:n]
-    for name, size in largest_objects:
-        print(f"{name}: {size / (1024 ** 2):.2f} MB")
+    """Displays the largest DataFrames and Arrow tables in memory."""
+    for description, size_mb in memory_profile.largest_frames(n):
+        print(f"{description}: {size_mb:.2f} MB")
 
 # Write a function to read configuration from a YAML file Monthly_Report.yaml
 def read_config(file_path="Monthly_Report.yaml"):
@@ -298,13 +439,14 @@ def read_config(file_path="Monthly_Report.yaml"):
 
 
 def s3write_using_qsave(data, bucket, object_key):
-    # Save the data locally as a .qs file
-    local_filename = Path(object_key).name
-    joblib.dump(data, local_filename, compress=('zlib', 3))
-
-    # Upload the file to S3
+    """
+    Uploads an object joblib-serialized in memory. DataFrames are better
+    stored with artifact_store.put_artifact.
+    """
+    buf = io.BytesIO()
+    joblib.dump(data, buf, compress=('zlib', 3))
     s3 = boto3.client('s3')
-    s3.upload_file(Filename=local_filename, Bucket=bucket, Key=object_key)
+    retry.call("s3", s3.put_object, Bucket=bucket, Key=object_key, Body=buf.getvalue())
 
 
 def get_month_abbrs(start_date, end_date):
@@ -0,0 +1,119 @@
+# watermarks.py
+
+import json
+import datetime
+import pandas as pd
+from botocore.exceptions import ClientError
+import retry
+
+# Per-table "last completed date" records live under this prefix, outside
+# mark/ so they never show up in table listings.
+WATERMARK_ROOT = "watermarks"
+
+# Earliest date probed when a table has no watermark yet
+PROBE_FLOOR = "2018-01-01"
+
+
+def _s3():
+    # Local import to avoid circular dependency
+    from s3_parquet_io import get_s3_client
+    return get_s3_client()
+
+
+def watermark_key(s3prefix):
+    return f"{WATERMARK_ROOT}/{s3prefix.strip('/')}.json"
+
+
+def get_watermark(bucket, s3prefix, s3=None):
+    """Returns (last completed date as YYYY-MM-DD, ETag) for a table prefix, or (None, None)."""
+    s3 = s3 or _s3()
+    try:
+        response = retry.call("s3", s3.get_object, Bucket=bucket, Key=watermark_key(s3prefix))
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None, None
+        raise
+    return json.loads(response["Body"].read())["date"], response["ETag"]
+
+
+def advance_watermark(bucket, s3prefix, date_, s3=None, n_tries=5):
+    """
+    Moves the watermark of a table prefix forward to date_, never backwards.
+
+    The record is replaced with an S3 conditional write against the ETag
+    that was read, so concurrent writers cannot overwrite a later date with
+    an earlier one; on a conflict the read and compare are repeated.
+    """
+    s3 = s3 or _s3()
+    date_ = pd.Timestamp(date_).strftime("%Y-%m-%d")
+    body = json.dumps({"date": date_, "updated": datetime.datetime.now().isoformat()})
+
+    for _ in range(n_tries):
+        current, etag = get_watermark(bucket, s3prefix, s3)
+        if current is not None and current >= date_:
+            return current
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            # A failed precondition is a permanent error, so it is not retried here
+            retry.call("s3", s3.put_object, Bucket=bucket, Key=watermark_key(s3prefix), Body=body.encode(),
+                       ContentType="application/json", **condition)
+            return date_
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409"):
+                print(f"Could not advance watermark for {s3prefix} to {date_}: {e}")
+                return None
+    print(f"Could not advance watermark for {s3prefix} to {date_} after {n_tries} conflicts")
+    return None
+
+
+def _date_has_data(s3, bucket, s3prefix, date_):
+    response = retry.call("s3", s3.list_objects_v2, Bucket=bucket, Prefix=f"{s3prefix}/date={date_:%Y-%m-%d}/",
+                          MaxKeys=1)
+    return response.get("KeyCount", 0) > 0
+
+
+def probe_last_date(bucket, s3prefix, floor=PROBE_FLOOR, s3=None):
+    """
+    Finds the latest date with data under s3prefix/date=YYYY-MM-DD/ without
+    listing the whole table. Steps back from yesterday in doubling strides
+    until a date with data is found, then bisects between the two, so the
+    cost is O(log days) single-key listings. Assumes the partitions run
+    contiguously up to the latest one.
+    """
+    s3 = s3 or _s3()
+    floor = pd.Timestamp(floor)
+    hi = pd.Timestamp(datetime.date.today() - datetime.timedelta(days=1))
+    if _date_has_data(s3, bucket, s3prefix, hi):
+        return hi.strftime("%Y-%m-%d")
+
+    step = 1
+    while True:
+        lo = max(hi - pd.Timedelta(days=step), floor)
+        if _date_has_data(s3, bucket, s3prefix, lo):
+            break
+        if lo == floor:
+            return None
+        hi, step = lo, step * 2
+
+    # Data on lo, none on hi
+    while (hi - lo).days > 1:
+        mid = lo + pd.Timedelta(days=(hi - lo).days // 2)
+        if _date_has_data(s3, bucket, s3prefix, mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo.strftime("%Y-%m-%d")
+
+
+def get_last_completed_date(bucket, s3prefix):
+    """
+    Returns the last completed date of a table prefix from its watermark.
+    Without a watermark the date is probed and recorded for the next run.
+    """
+    s3 = _s3()
+    last_date, _ = get_watermark(bucket, s3prefix, s3)
+    if last_date is None:
+        last_date = probe_last_date(bucket, s3prefix, s3=s3)
+        if last_date is not None:
+            advance_watermark(bucket, s3prefix, last_date, s3)
+    return last_date